@@ -0,0 +1,124 @@
+"""
+Аутентификация по токену с кэшем в памяти процесса.
+
+TokenAuthentication DRF на каждый запрос выбирает токен вместе
+с пользователем. Здесь снимок токена и пользователя живёт в
+ограниченном LRU-кэше не дольше AUTH_TOKEN_CACHE_TTL секунд. Запись
+сверяется с версией пользователя в кэше Django: выход, удаление токена,
+смена пароля и деактивация сдвигают версию после фиксации транзакции.
+Другие процессы видят сдвиг, только если кэш общий (CACHE_LOCATION);
+с LocMemCache они держат снимок до истечения TTL, поэтому без общего
+кэша TTL по умолчанию всего несколько секунд.
+"""
+from collections import OrderedDict
+from copy import copy
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+from recipe.versions import bump_version, get_version
+
+
+def auth_version_key(user_id):
+    """Версия токенов и учётных данных одного пользователя"""
+    return f'user_auth_version:{user_id}'
+
+
+def invalidate_user(user_id):
+    bump_version(auth_version_key(user_id))
+
+
+class TokenCache:
+    """LRU-кэш токен → (токен с пользователем, версия, срок)"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            token, version, expires_at = entry
+            if (expires_at > monotonic()
+                    and version == get_version(
+                        auth_version_key(token.user_id))):
+                with self._lock:
+                    self.hits += 1
+                return token
+            self.discard(key)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, token, version):
+        entry = (token, version, monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def render(self):
+        """Попадания и промахи в текстовом формате Prometheus"""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            size = len(self._entries)
+        total = hits + misses
+        lines = []
+        for name, kind, value in (
+            ('foodgram_auth_cache_hits_total', 'counter', hits),
+            ('foodgram_auth_cache_misses_total', 'counter', misses),
+            ('foodgram_auth_cache_hit_ratio', 'gauge',
+             round(hits / total, 4) if total else 0),
+            ('foodgram_auth_cache_size', 'gauge', size),
+        ):
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+token_cache = TokenCache(
+    settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который читает базу только при промахе"""
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            token, version = self.load_token(key)
+            token_cache.set(key, token, version)
+        # Запросу отдаётся копия, чтобы его изменения не попали в кэш
+        token = copy(token)
+        token.user = copy(token.user)
+        return token.user, token
+
+    def load_token(self, key):
+        """Токен из базы и версия, прочитанная до выборки пользователя
+
+        Если версию сдвинут во время выборки, запись сразу окажется
+        устаревшей, а не проживёт весь TTL.
+        """
+        user_id = self.get_model().objects.filter(key=key).values_list(
+            'user_id', flat=True
+        ).first()
+        version = None if user_id is None else get_version(
+            auth_version_key(user_id)
+        )
+        user, token = super().authenticate_credentials(key)
+        return token, version
@@ -0,0 +1,127 @@
+# Generated by Django 3.2.16 on 2026-10-18 22:10
+
+from django.db import migrations
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+# Таблицы, которые при AUTH_USER_MODEL = auth.User ссылались на auth_user
+USER_TABLES = (
+    ('authtoken', 'Token', 'user'),
+    ('admin', 'LogEntry', 'user'),
+)
+
+
+def references_auth_user(schema_editor, model, field):
+    """Внешний ключ в базе указывает на auth_user, а модель — уже нет"""
+    if field.related_model._meta.db_table == 'auth_user':
+        return False
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, model._meta.db_table
+        )
+    return any(
+        constraint['foreign_key']
+        and constraint['foreign_key'][0] == 'auth_user'
+        and constraint['columns'] == [field.column]
+        for constraint in constraints.values()
+    )
+
+
+USER_COLUMNS = (
+    'id', 'username', 'email', 'password', 'first_name', 'last_name',
+    'is_staff', 'is_active', 'is_superuser', 'last_login', 'date_joined'
+)
+
+
+def user_mapping(apps, schema_editor):
+    """id auth.User -> id api.MeUser по username
+
+    Пользователи без пары в api.MeUser переносятся туда вместе с хэшем
+    пароля, если их email свободен. Модель auth.User подменена, её
+    строки читаются SQL-запросом.
+    """
+    MeUser = apps.get_model('api', 'MeUser')
+    known = dict(MeUser.objects.values_list('username', 'id'))
+    emails = set(MeUser.objects.values_list('email', flat=True))
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {", ".join(USER_COLUMNS)} FROM auth_user ORDER BY id'
+        )
+        users = [dict(zip(USER_COLUMNS, row)) for row in cursor.fetchall()]
+    mapping = {}
+    for user in users:
+        old_id = user.pop('id')
+        for column in ('last_login', 'date_joined'):
+            value = user[column]
+            if isinstance(value, str):
+                value = parse_datetime(value)
+            if value is not None and timezone.is_naive(value):
+                # SQLite хранит время в UTC без зоны
+                value = timezone.make_aware(value, timezone.utc)
+            user[column] = value
+        if user['username'] not in known:
+            if not user['email'] or user['email'] in emails:
+                continue
+            emails.add(user['email'])
+            known[user['username']] = MeUser.objects.create(**user).id
+        mapping[old_id] = known[user['username']]
+    return mapping
+
+
+def repoint(apps, schema_editor, model, name, mapping):
+    """Перенос ссылок на api.MeUser и замена внешнего ключа
+
+    Строки пересоздаются с теми же ключами: у токена user_id уникален,
+    и построчный UPDATE мог бы столкнуться с ещё не перенесённой строкой.
+    Строки пользователей, которых не удалось перенести, удаляются —
+    они всё равно не могли бы войти.
+    """
+    field = model._meta.get_field(name)
+    rows = list(model.objects.all())
+    model.objects.all().delete()
+    for row in rows:
+        setattr(row, field.attname, mapping.get(getattr(row, field.attname)))
+    model.objects.bulk_create(
+        row for row in rows if getattr(row, field.attname) is not None
+    )
+    old_field = field.clone()
+    old_field.remote_field.model = apps.get_model('auth', 'User')
+    old_field.set_attributes_from_name(name)
+    old_field.model = model
+    schema_editor.alter_field(model, old_field, field)
+
+
+def repoint_user_foreign_keys(apps, schema_editor):
+    """Базы, мигрированные до AUTH_USER_MODEL = 'api.MeUser'
+
+    В новой базе authtoken и admin сразу ссылаются на api_meuser,
+    и миграция ничего не делает.
+    """
+    targets = []
+    for app_label, model_name, name in USER_TABLES:
+        model = apps.get_model(app_label, model_name)
+        if references_auth_user(
+                schema_editor, model, model._meta.get_field(name)):
+            targets.append((model, name))
+    if not targets:
+        return
+    mapping = user_mapping(apps, schema_editor)
+    for model, name in targets:
+        repoint(apps, schema_editor, model, name, mapping)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_follow_unique'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('authtoken', '0003_tokenproxy'),
+        ('admin', '0003_logentry_add_action_flag_choices'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            repoint_user_foreign_keys, migrations.RunPython.noop
+        ),
+    ]
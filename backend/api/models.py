@@ -52,6 +52,12 @@ class MeFollow (models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow'
+            )
+        ]
 
     def __str__(self):
         return f'Пользователь {self.user} подписан на автора {self.author}'
@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from .models import MeFollow
+from recipe.fields import RenditionField
+from recipe.models import MeRecipe
+from foodgram.metrics import TimedSerializerMixin
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions
+from django.db.models import Manager
 
 from django.contrib.auth import get_user_model
 
@@ -51,21 +55,63 @@ class MeUserRegistrationSerializer(serializers.Serializer):
         )
         return user
 
-class MeUserSerializer(serializers.Serializer):
+
+FOLLOWED_AUTHORS = 'followed_authors'
+
+
+def prefetch_follows(context, author_ids):
+    """Подписки текущего пользователя на авторов одним запросом
+
+    Результат кладётся в контекст сериализатора и общий для всех
+    вложенных сериализаторов ответа, уже известные авторы не
+    запрашиваются повторно.
+    """
+    request = context.get('request')
+    if not (request and request.user.is_authenticated):
+        return
+    known = context.setdefault(FOLLOWED_AUTHORS, {})
+    missing = set(author_ids) - known.keys()
+    if not missing:
+        return
+    followed = set(MeFollow.objects.filter(
+        user=request.user, author_id__in=missing
+    ).values_list('author_id', flat=True))
+    known.update((author, author in followed) for author in missing)
+
+
+class FollowStateListSerializer(serializers.ListSerializer):
+    """Список, который заранее узнаёт подписки на всех своих авторов
+
+    Поле с id автора задаёт follow_author_field сериализатора элемента.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        items = list(data)
+        field = self.child.follow_author_field
+        prefetch_follows(
+            self.context, {getattr(item, field) for item in items}
+        )
+        return super().to_representation(items)
+
+
+class MeUserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор пользователя"""
     is_followers = serializers.SerializerMethodField()
+    follow_author_field = 'id'
 
     class Meta:
         model = MeUser
         fields = ['id', 'username', 'last_name', 'first_name', 'email', 'is_followers']
+        read_only_fields = fields
+        list_serializer_class = FollowStateListSerializer
 
     def get_is_followers(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return MeFollow.objects.filter(
-                user=request.user,
-                author=obj
-            ).exists()
+            prefetch_follows(self.context, [obj.id])
+            return self.context[FOLLOWED_AUTHORS][obj.id]
         return False
     
 class PasswordChangeSerializer(serializers.Serializer):
@@ -76,3 +122,38 @@ class PasswordChangeSerializer(serializers.Serializer):
     def validate_new_password(self, value):
         validate_password(value)
         return value
+
+
+class RecipeShortSerializer(serializers.ModelSerializer):
+    """Краткий рецепт для списка подписок"""
+    illustration = RenditionField(rendition='thumb')
+    illustration_webp = RenditionField(
+        source='illustration', rendition='thumb', image_format='webp'
+    )
+
+    class Meta:
+        model = MeRecipe
+        fields = [
+            'id', 'name_recipe', 'illustration', 'illustration_webp', 'time'
+        ]
+
+
+class SubscriptionSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
+    """Сериализатор автора в подписках пользователя
+
+    recipes_count и is_followers приходят аннотациями из запроса,
+    recipes — заранее выбранные первые рецепты автора.
+    """
+    is_followers = serializers.BooleanField(read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
+    recipes = RecipeShortSerializer(
+        many=True, read_only=True, source='recipes_preview'
+    )
+
+    class Meta:
+        model = MeUser
+        fields = [
+            'id', 'username', 'last_name', 'first_name', 'email',
+            'is_followers', 'recipes', 'recipes_count'
+        ]
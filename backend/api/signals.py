@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_user
+
+
+def invalidate_on_commit(user_id):
+    """Сброс после фиксации: иначе параллельный запрос успеет
+    закэшировать ещё старую строку под новой версией"""
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    # Выход через токен удаляет его
+    invalidate_on_commit(instance.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_changed(instance, update_fields=None, **kwargs):
+    """Пароль, активность и прочие поля попадают в снимок кэша"""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_on_commit(instance.id)
+
+
+@receiver(user_logged_out)
+def user_logged_out_handler(user, **kwargs):
+    if user is not None:
+        invalidate_on_commit(user.id)
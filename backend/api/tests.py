@@ -1,3 +1,179 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 
-# Create your tests here.
+from recipe.models import MeRecipe
+from recipe.versions import get_version
+
+from .authentication import auth_version_key, token_cache
+from .models import MeFollow, MeUser
+
+
+class TokenCacheTest(TestCase):
+    """Снимок токена сбрасывается при выходе, удалении токена, смене
+    пароля и деактивации"""
+
+    url = '/api/users/me/'
+
+    def setUp(self):
+        cache.clear()
+        token_cache._entries.clear()
+        self.user = MeUser.objects.create_user(
+            username='token', email='token@example.com', password='old-pass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+
+    def get(self):
+        return self.client.get(self.url, **self.auth)
+
+    def assertRejected(self, response):
+        self.assertEqual(
+            response.data['detail'].code, 'authentication_failed'
+        )
+
+    def test_cached_between_requests(self):
+        self.assertEqual(self.get().status_code, 200)
+        hits = token_cache.hits
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(token_cache.hits, hits + 1)
+        self.assertFalse([
+            query for query in queries if 'authtoken_token' in query['sql']
+        ])
+
+    def test_token_delete(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertRejected(self.get())
+
+    def test_deactivation(self):
+        self.get()
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['is_active'])
+        self.assertRejected(self.get())
+
+    def test_change_password(self):
+        self.get()
+        version = get_version(auth_version_key(self.user.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/users/change_password/',
+                {'old_password': 'old-pass', 'new_password': 'N3w-pass!x'},
+                **self.auth
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(
+            get_version(auth_version_key(self.user.id)), version
+        )
+        misses = token_cache.misses
+        response = self.get()
+        self.assertEqual(token_cache.misses, misses + 1)
+        user = response.wsgi_request.user
+        self.assertTrue(user.check_password('N3w-pass!x'))
+
+    def test_logout(self):
+        self.client.force_login(self.user)
+        version = get_version(auth_version_key(self.user.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.logout()
+        self.assertGreater(
+            get_version(auth_version_key(self.user.id)), version
+        )
+
+    def test_last_login_keeps_snapshot(self):
+        version = get_version(auth_version_key(self.user.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.login(username='token', password='old-pass')
+        self.assertEqual(
+            get_version(auth_version_key(self.user.id)), version
+        )
+
+
+class SubscribeTest(TestCase):
+    """Повторная подписка — 400, а не IntegrityError"""
+
+    def setUp(self):
+        self.user = MeUser.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        self.author = MeUser.objects.create_user(
+            username='writer', email='writer@example.com', password='pass'
+        )
+        self.client.force_login(self.user)
+        self.url = f'/api/users/{self.author.id}/subscribe/'
+
+    def test_repeated_subscribe(self):
+        self.assertEqual(self.client.post(self.url).status_code, 201)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('errors', response.data)
+        self.assertEqual(
+            MeFollow.objects.filter(user=self.user).count(), 1
+        )
+
+    def test_self_subscribe(self):
+        response = self.client.post(f'/api/users/{self.user.id}/subscribe/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MeFollow.objects.exists())
+
+
+class FollowerQueriesTest(TestCase):
+    """Подписки: три запроса при любом числе авторов"""
+
+    url = '/api/users/follower/'
+
+    def setUp(self):
+        self.user = MeUser.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        self.client.force_login(self.user)
+
+    def follow(self, count):
+        for _ in range(count):
+            number = MeUser.objects.count()
+            author = MeUser.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com', password='pass'
+            )
+            MeRecipe.objects.bulk_create([
+                MeRecipe(
+                    name_recipe=f'Рецепт {i}', author=author,
+                    discriptions='Описание', illustration='',
+                    data=timezone.now(), time=10
+                ) for i in range(4)
+            ])
+            MeFollow.objects.create(user=self.user, author=author)
+
+    def get(self, **params):
+        # Сессия и пользователь читаются до представления
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'], len(queries) - 2
+
+    def test_fixed_query_count(self):
+        for count in (1, 4):
+            self.follow(count)
+            results, queries = self.get(recipes_limit=2)
+            # COUNT, авторы с recipes_count, превью рецептов
+            self.assertEqual(queries, 3)
+            self.assertEqual(len(results), MeFollow.objects.count())
+            for author in results:
+                self.assertEqual(author['recipes_count'], 4)
+                self.assertEqual(len(author['recipes']), 2)
+
+    def test_recipes_limit(self):
+        self.follow(1)
+        results, _ = self.get()
+        self.assertEqual(len(results[0]['recipes']), 3)
+        results, _ = self.get(recipes_limit=0)
+        self.assertEqual(results[0]['recipes'], [])
+        self.assertEqual(results[0]['recipes_count'], 4)
+        response = self.client.get(self.url, {'recipes_limit': 'x'})
+        self.assertEqual(response.status_code, 400)
@@ -3,11 +3,49 @@ from .serializers import (
     MeFollowSerializer, 
     MeUserRegistrationSerializer, 
     MeUserSerializer, 
-    PasswordChangeSerializer)
+    PasswordChangeSerializer,
+    SubscriptionSerializer)
 from rest_framework.decorators import action
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
+from django.db.models import (
+    Count, F, Prefetch, Value, prefetch_related_objects)
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import RowNumber
+from recipe.models import MeRecipe
+
+# Сколько рецептов автора показывать в подписках без recipes_limit
+RECIPES_PREVIEW_LIMIT = 3
+
+
+def recipes_preview(authors, limit=None):
+    """Первые limit рецептов каждого автора одним запросом
+
+    Рецепты нумеруются ROW_NUMBER() в разрезе автора, во внешнем
+    запросе остаются строки с номером не больше limit.
+    """
+    queryset = MeRecipe.objects.order_by('-data', '-id')
+    if limit is not None:
+        ranked = MeRecipe.objects.filter(
+            author__in=[author.id for author in authors]
+        ).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('author')],
+                order_by=[F('data').desc(), F('id').desc()]
+            )
+        ).values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        queryset = queryset.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            'WHERE ranked.row_number <= %s',
+            (*params, limit)
+        ))
+    return Prefetch(
+        'merecipe_set', queryset=queryset, to_attr='recipes_preview'
+    )
 
 
 class MeUserViewSet(viewsets.ModelViewSet):
@@ -17,6 +55,8 @@ class MeUserViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'create':
             return MeUserRegistrationSerializer
+        if self.action == 'follower':
+            return SubscriptionSerializer
         return MeUserSerializer
     
     def get_permissions(self):
@@ -39,13 +79,15 @@ class MeUserViewSet(viewsets.ModelViewSet):
         )
         if serializer.is_valid():
             user = request.user
-            if not user.check_password(serializer.data.get('current_password')):
+            if not user.check_password(
+                    serializer.validated_data['old_password']):
                 return Response(
-                    {"current_password": ["Неверный пароль"]},
+                    {"old_password": ["Неверный пароль"]},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            user.set_password(serializer.data.get('new_password'))
-            user.save()
+            user.set_password(serializer.validated_data['new_password'])
+            # Сохранение сдвигает версию и сбрасывает кэш токенов
+            user.save(update_fields=['password'])
             return Response({"status": "Пароль успешно изменен"})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -61,9 +103,17 @@ class MeUserViewSet(viewsets.ModelViewSet):
                 context={'request': request}
             )
             if serializer.is_valid():
-                serializer.save()
+                # unique_follow не проверяется сериализатором, повторная
+                # подписка дала бы IntegrityError
+                follow, created = MeFollow.objects.get_or_create(
+                    user=request.user, author=author
+                )
+                if not created:
+                    raise ValidationError(
+                        {'errors': ['Вы уже подписаны на этого автора']}
+                    )
                 return Response(
-                    serializer.data,
+                    MeFollowSerializer(follow).data,
                     status=status.HTTP_201_CREATED
                 )
             return Response(
@@ -83,13 +133,29 @@ class MeUserViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def follower(self, request):
         """Список подписок пользователя"""
-        subscribed_users = MeUser.objects.filter(
-            following__user=request.user
+        recipes_limit = request.query_params.get(
+            'recipes_limit', RECIPES_PREVIEW_LIMIT
         )
+        if not str(recipes_limit).isdigit():
+            raise ValidationError(
+                {'recipes_limit': ['Ожидается целое неотрицательное число']}
+            )
+        recipes_limit = int(recipes_limit)
+
+        subscribed_users = MeUser.objects.filter(
+            following_authors__user=request.user
+        ).annotate(
+            recipes_count=Count('merecipe'),
+            is_followers=Value(True)
+        ).order_by('username')
         page = self.paginate_queryset(subscribed_users)
+        authors = page if page is not None else list(subscribed_users)
+        if authors:
+            prefetch_related_objects(
+                authors, recipes_preview(authors, recipes_limit)
+            )
+
+        serializer = self.get_serializer(authors, many=True)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(subscribed_users, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
@@ -0,0 +1,42 @@
+"""
+Бэкенд PostgreSQL с пулом соединений, ENGINE = 'foodgram.db'.
+
+Настройки пула — ключ POOL в DATABASES (см. settings.py). Соединение
+берётся из пула при подключении и возвращается в него вместо закрытия,
+поэтому CONN_MAX_AGE должен быть 0.
+"""
+import psycopg2.extras
+from django.db.backends.postgresql.base import (
+    Database, DatabaseWrapper as PostgreSQLDatabaseWrapper)
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(PostgreSQLDatabaseWrapper):
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict.get('POOL', {}))
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.checkout(
+            lambda: Database.connect(**conn_params)
+        )
+        # Как в родительском классе, но и для соединения из пула
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.checkin(self.connection)
@@ -0,0 +1,202 @@
+"""
+Пул соединений PostgreSQL на процесс.
+
+В Django 3.2 нет встроенного пула, а CONN_MAX_AGE держит по соединению
+на поток. Пул отдаёт соединения бэкенду foodgram.db и принимает их
+обратно, когда Django закрывает соединение в конце запроса.
+"""
+import os
+from threading import Condition, Lock
+from time import monotonic, perf_counter
+
+from psycopg2 import Error, OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+_pools = {}
+_pools_lock = Lock()
+
+
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_time = 0.0
+        self.checkout_max = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+
+
+class ConnectionPool:
+    """Ограниченный пул с ожиданием, проверкой и ротацией соединений
+
+    max_size — предел соединений процесса, timeout — сколько ждать
+    свободного. Соединение, простоявшее дольше health_check_after
+    секунд, перед выдачей проверяется SELECT 1; старше max_lifetime —
+    закрывается.
+    """
+
+    def __init__(self, max_size=10, timeout=5.0, health_check_after=30.0,
+                 max_lifetime=1800.0):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+        self._condition = Condition()
+        # (соединение, время создания, время возврата)
+        self._idle = []
+        self._born = {}
+        self._total = 0
+        self._waiting = 0
+        self.stats = PoolStats()
+
+    def checkout(self, connect):
+        start = perf_counter()
+        deadline = monotonic() + self.timeout
+        while True:
+            connection = self._reserve(deadline)
+            if connection is None:
+                try:
+                    connection = connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                with self._condition:
+                    self._born[id(connection)] = monotonic()
+                    self.stats.created += 1
+            elif not self._healthy(*connection):
+                self._discard(connection[0])
+                continue
+            else:
+                connection = connection[0]
+            elapsed = perf_counter() - start
+            with self._condition:
+                self.stats.checkouts += 1
+                self.stats.checkout_time += elapsed
+                self.stats.checkout_max = max(
+                    self.stats.checkout_max, elapsed
+                )
+            return connection
+
+    def _reserve(self, deadline):
+        """Свободное соединение, None — если можно открыть новое"""
+        with self._condition:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._total < self.max_size:
+                    self._total += 1
+                    return None
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    self.stats.timeouts += 1
+                    raise OperationalError(
+                        f'Нет свободного соединения в пуле за {self.timeout} с'
+                    )
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _healthy(self, connection, born, returned):
+        now = monotonic()
+        if connection.closed or now - born > self.max_lifetime:
+            return False
+        if now - returned < self.health_check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Error:
+            return False
+
+    def checkin(self, connection):
+        """Возврат после запроса; незавершённая транзакция откатывается"""
+        if os.getpid() != self.pid:
+            return
+        try:
+            if (not connection.closed and connection.info.transaction_status
+                    != TRANSACTION_STATUS_IDLE):
+                connection.rollback()
+        except Error:
+            pass
+        if connection.closed or (
+                connection.info.transaction_status != TRANSACTION_STATUS_IDLE):
+            self._discard(connection)
+            return
+        with self._condition:
+            born = self._born.get(id(connection), monotonic())
+            self._idle.append((connection, born, monotonic()))
+            self._condition.notify()
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Error:
+            pass
+        with self._condition:
+            self._born.pop(id(connection), None)
+            self.stats.discarded += 1
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._condition:
+            self._total -= 1
+            self._condition.notify()
+
+    def snapshot(self):
+        with self._condition:
+            stats = vars(self.stats).copy()
+            stats.update(
+                size=self._total,
+                idle=len(self._idle),
+                in_use=self._total - len(self._idle),
+                waiting=self._waiting,
+                max_size=self.max_size,
+            )
+            return stats
+
+
+def get_pool(alias, options):
+    """Пул текущего процесса; после fork создаётся заново"""
+    pool = _pools.get(alias)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[alias] = ConnectionPool(**options)
+        return pool
+
+
+def render_pools():
+    """Состояние пулов процесса в текстовом формате Prometheus"""
+    pid = os.getpid()
+    pools = [
+        (alias, pool.snapshot()) for alias, pool in sorted(_pools.items())
+        if pool.pid == pid
+    ]
+    if not pools:
+        return ''
+    lines = []
+    for name, kind, key in (
+        ('foodgram_db_pool_connections_in_use', 'gauge', 'in_use'),
+        ('foodgram_db_pool_connections_idle', 'gauge', 'idle'),
+        ('foodgram_db_pool_waiting', 'gauge', 'waiting'),
+        ('foodgram_db_pool_max_size', 'gauge', 'max_size'),
+        ('foodgram_db_pool_checkouts_total', 'counter', 'checkouts'),
+        ('foodgram_db_pool_checkout_seconds_total', 'counter',
+         'checkout_time'),
+        ('foodgram_db_pool_checkout_seconds_max', 'gauge', 'checkout_max'),
+        ('foodgram_db_pool_timeouts_total', 'counter', 'timeouts'),
+        ('foodgram_db_pool_created_total', 'counter', 'created'),
+        ('foodgram_db_pool_discarded_total', 'counter', 'discarded'),
+    ):
+        lines.append(f'# TYPE {name} {kind}')
+        for alias, stats in pools:
+            lines.append(
+                f'{name}{{alias="{alias}",pid="{pid}"}} {stats[key]}'
+            )
+    return '\n'.join(lines) + '\n'
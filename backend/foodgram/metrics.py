@@ -0,0 +1,148 @@
+"""
+Метрики запросов: число SQL-запросов, время в базе и в сериализаторах.
+
+Счётчики текущего запроса живут в contextvars, накопленные гистограммы
+по маршрутам хранятся в памяти процесса и отдаются в текстовом формате
+Prometheus.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class RequestTiming:
+    """Счётчики одного запроса"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.queries += 1
+
+
+current_timing = ContextVar('current_timing', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка соединения: пишет запрос в счётчики текущего запроса
+
+    Счётчики берутся из contextvars, поэтому учитываются и запросы из
+    sync_to_async, где у потока своё соединение.
+    """
+    timing = current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    return timing.execute(execute, sql, params, many, context)
+
+
+def install_query_timer(connection, **kwargs):
+    """Обработчик connection_created, повторно обёртку не добавляет"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def serializer_timer():
+    """Время сериализации; вложенные сериализаторы не считаются повторно"""
+    timing = current_timing.get()
+    if timing is None or timing.serializer_depth:
+        yield
+        return
+    timing.serializer_depth += 1
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timing.serializer_time += perf_counter() - start
+        timing.serializer_depth -= 1
+
+
+class TimedSerializerMixin:
+    """Учитывает to_representation во времени сериализации запроса"""
+
+    def to_representation(self, instance):
+        with serializer_timer():
+            return super().to_representation(instance)
+
+
+class RouteStats:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+
+
+class MetricsRegistry:
+    """Гистограммы длительности и суммы по маршрутам"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._routes = {}
+
+    def observe(self, route, duration, timing):
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = RouteStats()
+            stats.buckets[bisect_left(BUCKETS, duration)] += 1
+            stats.count += 1
+            stats.total += duration
+            stats.queries += timing.queries
+            stats.db_time += timing.db_time
+            stats.serializer_time += timing.serializer_time
+
+    def render(self):
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                '# TYPE foodgram_request_duration_seconds histogram',
+            ]
+            for route, stats in routes:
+                cumulative = 0
+                for bound, value in zip(
+                    BUCKETS + ('+Inf',), stats.buckets
+                ):
+                    cumulative += value
+                    lines.append(
+                        'foodgram_request_duration_seconds_bucket'
+                        f'{{route="{route}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'foodgram_request_duration_seconds_sum'
+                    f'{{route="{route}"}} {stats.total:.6f}'
+                )
+                lines.append(
+                    f'foodgram_request_duration_seconds_count'
+                    f'{{route="{route}"}} {stats.count}'
+                )
+            for name, attribute, kind in (
+                ('foodgram_db_queries_total', 'queries', 'counter'),
+                ('foodgram_db_duration_seconds_total', 'db_time', 'counter'),
+                ('foodgram_serializer_duration_seconds_total',
+                 'serializer_time', 'counter'),
+            ):
+                lines.append(f'# TYPE {name} {kind}')
+                for route, stats in routes:
+                    value = getattr(stats, attribute)
+                    if isinstance(value, float):
+                        value = f'{value:.6f}'
+                    lines.append(f'{name}{{route="{route}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
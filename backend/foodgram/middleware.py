@@ -0,0 +1,105 @@
+import asyncio
+from time import perf_counter
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import (
+    RequestTiming, current_timing, install_query_timer, registry)
+from .routers import mark_sticky
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RequestMetricsMiddleware:
+    """Считает SQL-запросы и время запроса, пишет заголовок Server-Timing
+
+    Работает и в синхронной, и в асинхронной цепочке, чтобы под ASGI
+    асинхронные представления не переводились обратно в поток.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        connection_created.connect(install_query_timer)
+        for connection in connections.all():
+            install_query_timer(connection)
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django распознаёт асинхронный экземпляр middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self.finish(request, response, timing, start)
+
+    async def __acall__(self, request):
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self.finish(request, response, timing, start)
+
+    def finish(self, request, response, timing, start):
+        duration = perf_counter() - start
+        match = request.resolver_match
+        registry.observe(
+            match.view_name if match else 'unmatched', duration, timing
+        )
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={timing.db_time * 1000:.1f};'
+            f'desc="{timing.queries} queries"',
+            f'serializer;dur={timing.serializer_time * 1000:.1f}',
+            f'total;dur={duration * 1000:.1f}',
+        ))
+        return response
+
+
+class PrimaryAfterWriteMiddleware:
+    """После успешной записи закрепляет пользователя за основной базой
+
+    Пользователь берётся после ответа: DRF кладёт в запрос Django
+    пользователя, определённого по токену.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.is_write(request, response):
+            mark_sticky(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.is_write(request, response):
+            # Ленивый пользователь сессии может обратиться к базе
+            await sync_to_async(mark_sticky)(request, response)
+        return response
+
+    @staticmethod
+    def is_write(request, response):
+        return (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and hasattr(request, 'user')
+        )
@@ -0,0 +1,122 @@
+"""
+Чтение с реплик для горячих представлений.
+
+Представление включает чтение с реплики на время запроса через
+replica_reads(), остальной код и все записи работают с default.
+После записи пользователь на DB_REPLICA_STICKY_SECONDS закрепляется
+за основной базой, чтобы видеть свои изменения до репликации.
+Закрепление хранится в общем кэше (клиенты с токеном) и в подписанной
+cookie (браузер): cookie не зависит от того, в какой процесс попадёт
+следующий запрос, даже без общего кэша.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+read_from_replica = ContextVar('read_from_replica', default=False)
+
+STICKY_COOKIE = 'db_primary'
+STICKY_SALT = 'foodgram.routers.sticky'
+
+
+def sticky_key(user_id):
+    return f'db_sticky:{user_id}'
+
+
+def mark_sticky(request, response):
+    """Пользователь только что писал: ближайшие чтения — с основной базы"""
+    user = request.user
+    if not settings.DATABASE_REPLICAS or not user.is_authenticated:
+        return
+    seconds = settings.DB_REPLICA_STICKY_SECONDS
+    cache.set(sticky_key(user.id), True, seconds)
+    response.set_signed_cookie(
+        STICKY_COOKIE, str(user.id), salt=STICKY_SALT, max_age=seconds,
+        httponly=True, samesite='Lax'
+    )
+
+
+def is_sticky(request):
+    user = request.user
+    if not user.is_authenticated:
+        return False
+    marked = request.get_signed_cookie(
+        STICKY_COOKIE, default=None, salt=STICKY_SALT,
+        max_age=settings.DB_REPLICA_STICKY_SECONDS
+    )
+    return marked == str(user.id) or bool(cache.get(sticky_key(user.id)))
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = read_from_replica.set(enabled)
+    try:
+        yield
+    finally:
+        read_from_replica.reset(token)
+
+
+def reading_replica():
+    """Чтения текущего запроса могут уйти на реплику"""
+    return bool(settings.DATABASE_REPLICAS) and read_from_replica.get()
+
+
+class ReplicaRouter:
+    """Чтение с реплики только внутри replica_reads() и вне транзакции"""
+
+    def choose_replica(self):
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not read_from_replica.get():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return self.choose_replica()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaReadMixin:
+    """Чтение с реплики для replica_actions вьюсета
+
+    Запись, переключатели избранного и корзины и запросы пользователя,
+    недавно писавшего в базу, остаются на основной базе. Версии для
+    ETag и кэша ответов поднимаются при записи в основную базу, а
+    реплика может отставать: ответ с реплики не кэшируется и уходит
+    без валидаторов (см. ConditionalGetMixin.conditional).
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def use_replica(self, request):
+        return (
+            request.method in SAFE_METHODS
+            and self.action in self.replica_actions
+            and not is_sticky(request)
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._replica_token = read_from_replica.set(
+            self.use_replica(request)
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            read_from_replica.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
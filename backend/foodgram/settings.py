@@ -28,6 +28,9 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# Адреса, с которых доступен /metrics/ без входа под сотрудником
+INTERNAL_IPS = os.getenv('INTERNAL_IPS', '127.0.0.1').split(',')
+
 
 # Application definition
 
@@ -48,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.middleware.RequestMetricsMiddleware',
+    'foodgram.middleware.PrimaryAfterWriteMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,10 +94,48 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
     }
 }
 
+# Пул соединений на процесс вместо подключения на каждый запрос
+if os.getenv('DB_POOL', 'False') == 'True':
+    DATABASES['default'].update({
+        'ENGINE': 'foodgram.db',
+        # Соединение возвращается в пул в конце каждого запроса
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'max_size': int(os.getenv('DB_POOL_SIZE', 10)),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+            'health_check_after': float(
+                os.getenv('DB_POOL_HEALTH_CHECK_AFTER', 30)),
+            'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+        },
+    })
+
+# Реплики только для чтения: копии default с другим хостом.
+# Для проверки на одной машине — второй локальный PostgreSQL,
+# например DB_REPLICA_HOSTS=127.0.0.1:5433
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    host, _, port = address.partition(':')
+    alias = f'replica_{number}'
+    DATABASES[alias] = dict(
+        DATABASES['default'], HOST=host,
+        PORT=port or DATABASES['default']['PORT'],
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['foodgram.routers.ReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5))
+
+# Рецепты, подписки и токены ссылаются на api.MeUser. В базе, где
+# authtoken и admin уже мигрированы с auth.User, ссылки переносит
+# api/migrations/0004_repoint_user_foreign_keys.
+AUTH_USER_MODEL = 'api.MeUser'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -134,6 +177,47 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Процессы для сборки уменьшенных копий фото рецептов
+RENDITION_WORKERS = int(os.getenv('RENDITION_WORKERS', 2))
+
+# Загрузка фото рецептов: предел тела запроса, файла и разрешения,
+# размер пула декодирования и время ожидания слота в нём
+RECIPE_UPLOAD_MAX_BYTES = int(
+    os.getenv('RECIPE_UPLOAD_MAX_BYTES', 12 * 1024 * 1024))
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.getenv('RECIPE_IMAGE_MAX_BYTES', 8 * 1024 * 1024))
+RECIPE_IMAGE_MAX_PIXELS = int(os.getenv('RECIPE_IMAGE_MAX_PIXELS', 40_000_000))
+RECIPE_IMAGE_MAX_SIDE = int(os.getenv('RECIPE_IMAGE_MAX_SIDE', 2560))
+IMAGE_DECODE_WORKERS = int(os.getenv('IMAGE_DECODE_WORKERS', 2))
+IMAGE_DECODE_TIMEOUT = int(os.getenv('IMAGE_DECODE_TIMEOUT', 30))
+
+# Общий кэш обязателен, если процессов больше одного: в нём версии
+# снимков в памяти и кэша ответов, закрепление за основной базой после
+# записи и версии токенов. Без CACHE_LOCATION (host:port memcached,
+# через запятую) кэш локален процессу — это только для разработки,
+# manage.py check --deploy об этом предупреждает.
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '')
+if CACHE_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_LOCATION.split(','),
+            'KEY_PREFIX': 'foodgram',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Асинхронные обработчики горячих маршрутов, включаются в asgi.py
+ASYNC_HOT_PATHS = os.getenv('ASYNC_HOT_PATHS', 'False') == 'True'
+
+# Сколько клиенты и прокси хранят список тегов без перепроверки
+CATEGORIES_MAX_AGE = int(os.getenv('CATEGORIES_MAX_AGE', 60 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -142,7 +226,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -151,3 +235,10 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+# Снимки токенов в памяти процесса: сколько хранить и как долго.
+# Сброс снимков во всех процессах идёт через версию в общем кэше; без
+# CACHE_LOCATION другие процессы его не видят, поэтому снимок живёт
+# лишь несколько секунд.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TTL = float(
+    os.getenv('AUTH_TOKEN_CACHE_TTL', 300 if CACHE_LOCATION else 5))
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from api.authentication import token_cache
+
+from .db.pool import render_pools
+from .metrics import registry
+
+
+def metrics(request):
+    """Гистограммы запросов, пулы соединений и кэш токенов для Prometheus"""
+    if not (
+        request.user.is_staff
+        or request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render() + render_pools() + token_cache.render(),
+        content_type='text/plain; version=0.0.4'
+    )
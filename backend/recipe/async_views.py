@@ -0,0 +1,160 @@
+"""
+Асинхронные обработчики горячих GET-маршрутов для запуска под ASGI.
+
+В Django 3.2 нет асинхронного ORM, а DRF не поддерживает асинхронные
+представления. Поэтому здесь асинхронный быстрый путь: ответ 304,
+готовый ответ из кэша и автодополнение из индекса в памяти отдаются
+без потока синхронных представлений. Остальное (промах кэша,
+авторизованные пользователи, запись) уходит в обычный вьюсет через
+sync_to_async. Маршруты подключаются при ASYNC_HOT_PATHS.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from .cache import cached_data, response_cache_key
+from .conditional import make_etag
+from .index import ingredient_index
+from .models import MeRecipe
+from .versions import INGREDIENTS_VERSION, get_version
+from .views import MeIngredientViewSet, MeRecipeViewSet
+
+JSON_MEDIA_TYPE = 'application/json'
+JSON_ACCEPT = {'', '*/*', JSON_MEDIA_TYPE}
+
+ingredient_list_view = MeIngredientViewSet.as_view(
+    {'get': 'list', 'post': 'create'}
+)
+recipe_list_view = MeRecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+recipe_detail_view = MeRecipeViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy'
+})
+
+
+def fast_path_allowed(request, anonymous=True):
+    """GET с ответом в JSON; anonymous — только без учётных данных
+
+    Тогда ответ не зависит от пользователя и совпадает с тем, что
+    отдал бы DRF, а проверять токен или сессию не нужно.
+    """
+    if request.method != 'GET' or 'format' in request.GET:
+        return False
+    if request.META.get('HTTP_ACCEPT', '') not in JSON_ACCEPT:
+        return False
+    return not anonymous or (
+        'HTTP_AUTHORIZATION' not in request.META
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+def finalize(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+    return response
+
+
+def json_response(request, data, etag, last_modified=None):
+    """Ответ 304 или данные, как их отрендерил бы DRF"""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        if data is None:
+            return None
+        response = HttpResponse(
+            JSONRenderer().render(data), content_type=JSON_MEDIA_TYPE
+        )
+    return finalize(response, etag, last_modified)
+
+
+def cached_recipes(request, updated_at=None, pk=None):
+    """Ответ по ETag или из кэша ответов, None — если нужен вьюсет
+
+    Валидаторы те же, что у MeRecipeViewSet.get_validators для анонима.
+    """
+    if pk is None:
+        action, last_modified = 'list', None
+    else:
+        action, last_modified = 'retrieve', int(updated_at.timestamp())
+    etag = make_etag(
+        request, JSON_MEDIA_TYPE, *MeRecipeViewSet.etag_parts(updated_at)
+    )
+    response = json_response(request, None, etag, last_modified)
+    if response is not None:
+        return response
+    data = cached_data(response_cache_key(request, action, pk))
+    return json_response(request, data, etag, last_modified)
+
+
+def indexed_ingredients(request, limit):
+    """Ответ из индекса или None, если индекс нужно пересобрать"""
+    if ingredient_index.stale():
+        return None
+    etag = make_etag(
+        request, JSON_MEDIA_TYPE, get_version(INGREDIENTS_VERSION)
+    )
+    return json_response(request, ingredient_index.search(
+        request.GET.get('name', ''), limit
+    ), etag)
+
+
+# Кэш и индекс потокобезопасны, им не нужен поток синхронных представлений
+cached_recipes_async = sync_to_async(cached_recipes, thread_sensitive=False)
+indexed_ingredients_async = sync_to_async(
+    indexed_ingredients, thread_sensitive=False
+)
+
+
+async def ingredient_list(request):
+    """Автодополнение ингредиентов без потока синхронных представлений
+
+    Ответ одинаков для всех пользователей, поэтому токен не проверяется.
+    """
+    limit = request.GET.get('limit')
+    if fast_path_allowed(request, anonymous=False) and (
+            limit is None or limit.isdigit()):
+        limit = None if limit is None else int(limit)
+        response = await indexed_ingredients_async(request, limit)
+        if response is None:
+            # Пересборка читает базу, только в синхронном потоке
+            await sync_to_async(ingredient_index.refresh)()
+            response = await indexed_ingredients_async(request, limit)
+        if response is not None:
+            return response
+    return await sync_to_async(ingredient_list_view)(request)
+
+
+async def recipe_list(request):
+    if fast_path_allowed(request):
+        response = await cached_recipes_async(request)
+        if response is not None:
+            return response
+    return await sync_to_async(recipe_list_view)(request)
+
+
+def recipe_updated_at(pk):
+    # Как и версии в ETag, читается с основной базы
+    return MeRecipe.objects.filter(pk=pk).values_list(
+        'updated_at', flat=True
+    ).first()
+
+
+async def recipe_detail(request, pk):
+    if fast_path_allowed(request):
+        updated_at = await sync_to_async(recipe_updated_at)(pk)
+        if updated_at is not None:
+            response = await cached_recipes_async(request, updated_at, pk)
+            if response is not None:
+                return response
+    return await sync_to_async(recipe_detail_view)(request, pk=pk)
+
+
+for view in (ingredient_list, recipe_list, recipe_detail):
+    # Проверку CSRF для API выполняет DRF, как и в as_view()
+    view.csrf_exempt = True
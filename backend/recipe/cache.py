@@ -0,0 +1,64 @@
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+
+from .versions import (
+    RECIPES_VERSION, RELATED_VERSIONS, get_version, get_versions)
+
+RESPONSE_TIMEOUT = 60 * 10
+HITS = 'recipes_cache_hits'
+MISSES = 'recipes_cache_misses'
+
+
+def response_cache_key(request, action, pk=None):
+    """Ключ ответа: версии данных, действие и нормализованный запрос
+
+    Параметры сортируются, чтобы ?tags=a&tags=b и ?tags=b&tags=a
+    попадали в одну запись. Хост входит в ключ, так как ссылки
+    пагинации абсолютные. Хост и параметры хешируются: ключ memcached
+    ограничен 250 символами без пробелов.
+    """
+    params = sorted(
+        (name, value)
+        for name, values in request.GET.lists()
+        for value in values
+    )
+    versions = get_versions((RECIPES_VERSION,) + RELATED_VERSIONS)
+    return ':'.join((
+        'recipes',
+        '.'.join(map(str, versions)),
+        action,
+        str(pk or ''),
+        md5(f'{request.get_host()}?{urlencode(params)}'.encode())
+        .hexdigest()
+    ))
+
+
+def count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def cached_data(key):
+    data = cache.get(key)
+    count(MISSES if data is None else HITS)
+    return data
+
+
+def store_data(key, data):
+    cache.set(key, data, RESPONSE_TIMEOUT)
+
+
+def cache_stats():
+    hits = cache.get(HITS, 0)
+    misses = cache.get(MISSES, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+        'version': get_version(RECIPES_VERSION),
+    }
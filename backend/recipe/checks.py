@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def shared_cache_check(app_configs, **kwargs):
+    """Версии снимков и кэша ответов должны быть общими для процессов"""
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        'Кэш по умолчанию локален процессу: сдвиги версий, закрепление '
+        'за основной базой и выход пользователя не видны другим '
+        'процессам.',
+        hint='Задайте CACHE_LOCATION с адресом memcached.',
+        id='recipe.W001',
+    )]
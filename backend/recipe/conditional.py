@@ -0,0 +1,76 @@
+"""
+Условные GET-запросы для рецептов и справочников.
+
+ETag и Last-Modified считаются по версиям в кэше и updated_at без
+сериализации, поэтому 304 отдаётся до выборки данных.
+"""
+from hashlib import md5
+
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+
+from foodgram.routers import reading_replica
+
+from .renditions import track_pending
+from .versions import get_version, user_version_key
+
+
+def make_etag(request, media_type, *parts):
+    """ETag от адреса, формата ответа и переданных версий"""
+    key = ':'.join(map(str, (
+        request.get_host(), request.get_full_path(), media_type
+    ) + parts))
+    return quote_etag(md5(key.encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """Ответ 304 на If-None-Match / If-Modified-Since
+
+    Вьюсет переопределяет get_validators и оборачивает обработчики
+    в conditional.
+    """
+
+    def get_validators(self, request, *args, **kwargs):
+        """Пара (ETag, Last-Modified), любой элемент может быть None"""
+        return None, None
+
+    def request_etag(self, request, *parts, per_user=False):
+        """ETag ответа этого вьюсета
+
+        per_user добавляет пользователя и версию его избранного,
+        корзины и подписок — от них зависят флаги в ответе.
+        """
+        user = request.user
+        if per_user and user.is_authenticated:
+            parts += (user.id, get_version(user_version_key(user.id)))
+        return make_etag(request, request.accepted_media_type, *parts)
+
+    def conditional(self, view, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request, *args, **kwargs)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            with track_pending() as renditions:
+                response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            if renditions.pending:
+                # Адрес оригинала сменится адресом копии, 304 по такому
+                # ETag оставил бы клиенту оригинал
+                patch_cache_control(response, no_cache=True)
+                patch_vary_headers(response, ('Authorization', 'Cookie'))
+                return response
+            if reading_replica():
+                # Данные реплики могут быть старше версий в ETag
+                patch_vary_headers(response, ('Authorization', 'Cookie'))
+                return response
+        if etag:
+            response['ETag'] = etag
+        if timestamp:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
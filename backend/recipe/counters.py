@@ -0,0 +1,64 @@
+"""
+Денормализованные счётчики избранного и корзины на MeRecipe.
+
+Значения меняют сигналы post_save (создание) и post_delete атомарно
+через F() без чтения строки. bulk_create сигналы обходит, после него и
+при расхождении с таблицами (ручные правки, сбои) счётчики
+пересчитывает reconcile().
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import MeRecipe, Select, ShoppingList
+
+# Поле счётчика: модель связи и её внешний ключ на рецепт
+COUNTERS = {
+    'favorites_count': (Select, 'name_recipe'),
+    'in_carts_count': (ShoppingList, 'recipe'),
+}
+
+
+def increment(recipe_id, field):
+    MeRecipe.objects.filter(pk=recipe_id).update(**{field: F(field) + 1})
+
+
+def decrement(recipe_id, field):
+    MeRecipe.objects.filter(pk=recipe_id).update(
+        **{field: Greatest(F(field) - 1, 0)}
+    )
+
+
+def actual_count(field):
+    """Подзапрос с фактическим числом строк для счётчика field"""
+    model, recipe_field = COUNTERS[field]
+    return Coalesce(Subquery(
+        model.objects.filter(**{recipe_field: OuterRef('pk')})
+        .order_by().values(recipe_field)
+        .annotate(total=Count('id')).values('total')
+    ), 0)
+
+
+def reconcile(batch_size=10000):
+    """Пересчёт разошедшихся счётчиков пачками по id
+
+    Возвращает число исправленных рецептов по каждому счётчику.
+    """
+    fixed = dict.fromkeys(COUNTERS, 0)
+    last_id = 0
+    while True:
+        ids = list(MeRecipe.objects.filter(pk__gt=last_id).order_by('pk')
+                   .values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return fixed
+        last_id = ids[-1]
+        for field in COUNTERS:
+            drifted = list(
+                MeRecipe.objects.filter(pk__in=ids)
+                .annotate(actual=actual_count(field))
+                .exclude(**{field: F('actual')})
+                .values_list('pk', flat=True)
+            )
+            if drifted:
+                fixed[field] += MeRecipe.objects.filter(
+                    pk__in=drifted
+                ).update(**{field: actual_count(field)})
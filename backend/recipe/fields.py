@@ -0,0 +1,72 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+from .images import ImageDecodeBusy, ImageRejected, process_image
+from .renditions import rendition_url
+
+
+class ImageDecodeUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер занят обработкой изображений, повторите позже'
+    default_code = 'image_decode_busy'
+
+
+class RenditionField(serializers.Field):
+    """Адрес уменьшенной копии фото рецепта
+
+    Без явного rendition размер выбирается по действию: в списке
+    карточка, на странице рецепта крупная копия.
+    """
+
+    def __init__(self, rendition=None, image_format='jpeg', **kwargs):
+        self.rendition = rendition
+        self.image_format = image_format
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, image):
+        if not image:
+            return None
+        rendition = self.rendition
+        if rendition is None:
+            view = self.context.get('view')
+            list_view = view is not None and view.action == 'list'
+            rendition = 'card' if list_view else 'detail'
+        url = rendition_url(image, rendition, self.image_format)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class InlineImageField(serializers.ImageField):
+    """Фото рецепта строкой base64 (data URL) или файлом
+
+    Размер проверяется до декодирования, само декодирование и
+    перекодирование выполняются в пуле процессов recipe.images.
+    """
+
+    def to_internal_value(self, data):
+        max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+        if isinstance(data, str):
+            if data.startswith('data:'):
+                data = data.partition(';base64,')[2]
+            if len(data) * 3 // 4 > max_bytes:
+                raise serializers.ValidationError('Файл слишком большой')
+            payload, is_base64 = data, True
+        elif hasattr(data, 'read'):
+            if data.size > max_bytes:
+                raise serializers.ValidationError('Файл слишком большой')
+            payload, is_base64 = data, False
+        else:
+            self.fail('invalid')
+
+        try:
+            content, extension = process_image(payload, is_base64)
+        except ImageRejected as error:
+            raise serializers.ValidationError(str(error))
+        except ImageDecodeBusy:
+            raise ImageDecodeUnavailable()
+        return ContentFile(content, name=f'{uuid4().hex}.{extension}')
@@ -1,15 +1,43 @@
 import django_filters
-from .models import MeRecipe, MeCategory
+from .index import category_snapshot
+from .models import MeRecipe
+from .pagination import POPULAR_ORDERING
+from .search import search_recipes
+
+
+def tag_choices():
+    # Функция, а не метод снимка: фильтры копируются через deepcopy
+    return category_snapshot.choices()
+
 
 class RecipeFilter(django_filters.FilterSet):
     """Фильтр для рецептов"""
-    tags = django_filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=MeCategory.objects.all()
+    tags = django_filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags'
     )
     author = django_filters.NumberFilter(field_name='author__id')
+    search = django_filters.CharFilter(method='filter_search')
+    ordering = django_filters.ChoiceFilter(
+        choices=[('popular', 'По числу добавлений в избранное')],
+        method='filter_ordering'
+    )
     
     class Meta:
         model = MeRecipe
-        fields = ['tags', 'author']
\ No newline at end of file
+        fields = ['tags', 'author', 'search', 'ordering']
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов, слаги → id из снимка"""
+        tagged = MeRecipe.tags.through.objects.filter(
+            mecategory_id__in=category_snapshot.ids(value)
+        ).values('merecipe_id')
+        return queryset.filter(id__in=tagged)
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск, сортировка по релевантности"""
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по счётчику избранного, под неё recipe_popular_idx"""
+        return queryset.order_by(*POPULAR_ORDERING)
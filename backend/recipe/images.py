@@ -0,0 +1,171 @@
+"""
+Разбор загруженных фото рецептов вне потока запроса.
+
+Загрузка пишется во временный файл по частям с проверкой размера, в
+пул процессов передаётся только путь. Декодирование, проверка размеров
+и перекодирование выполняются в пуле. Число задач ограничено слотами,
+слот держится до конца задачи, даже если запрос уже получил 503:
+память пула не растёт при наплыве загрузок.
+"""
+import base64
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from io import BytesIO
+from tempfile import NamedTemporaryFile
+from threading import BoundedSemaphore, Lock
+
+import django
+from django.conf import settings
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+# Кратно 4, чтобы куски base64 декодировались независимо
+BASE64_CHUNK = 64 * 1024
+
+
+class ImageRejected(Exception):
+    """Изображение не прошло проверку"""
+
+
+class ImageDecodeBusy(Exception):
+    """Все слоты пула заняты"""
+
+
+def spool_upload(data, is_base64, max_bytes):
+    """Загрузка во временный файл для пула: (путь, удалить ли после)
+
+    base64 декодируется кусками, файл копируется по частям; размер
+    проверяется по мере записи. Файл, который Django уже сохранил на
+    диск, передаётся как есть.
+    """
+    if not is_base64 and hasattr(data, 'temporary_file_path'):
+        if data.size > max_bytes:
+            raise ImageRejected('Файл слишком большой')
+        return data.temporary_file_path(), False
+    if is_base64:
+        chunks = (
+            base64.b64decode(data[start:start + BASE64_CHUNK], validate=True)
+            for start in range(0, len(data), BASE64_CHUNK)
+        )
+    else:
+        chunks = data.chunks()
+    file = NamedTemporaryFile(prefix='upload-', delete=False)
+    try:
+        with file:
+            written = 0
+            for chunk in chunks:
+                written += len(chunk)
+                if written > max_bytes:
+                    raise ImageRejected('Файл слишком большой')
+                file.write(chunk)
+    except Exception as error:
+        os.unlink(file.name)
+        if isinstance(error, ValueError):
+            raise ImageRejected('Некорректные данные base64')
+        raise
+    return file.name, True
+
+
+def decode_image(path, max_bytes, max_pixels, max_side):
+    """Проверка и перекодирование одного изображения, выполняется в пуле
+
+    Pillow читает сначала только заголовок: размер в пикселях
+    проверяется до загрузки растра.
+    """
+    if os.path.getsize(path) > max_bytes:
+        raise ImageRejected('Файл слишком большой')
+    with open(path, 'rb') as raw:
+        try:
+            image = Image.open(raw)
+        except UnidentifiedImageError:
+            raise ImageRejected('Файл не является изображением')
+        except Image.DecompressionBombError:
+            raise ImageRejected('Слишком большое разрешение изображения')
+        if image.format not in ALLOWED_FORMATS:
+            raise ImageRejected(f'Формат {image.format} не поддерживается')
+        if image.width * image.height > max_pixels:
+            raise ImageRejected('Слишком большое разрешение изображения')
+        try:
+            image.load()
+        except (OSError, Image.DecompressionBombError):
+            raise ImageRejected('Изображение повреждено')
+
+    image = ImageOps.exif_transpose(image)
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    output = BytesIO()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image.save(output, 'PNG', optimize=True)
+        return output.getvalue(), 'png'
+    image.convert('RGB').save(output, 'JPEG', quality=90)
+    return output.getvalue(), 'jpg'
+
+
+def _setup_worker(max_pixels):
+    django.setup()
+    Image.MAX_IMAGE_PIXELS = max_pixels
+
+
+_lock = Lock()
+_executor = None
+_slots = None
+
+
+def get_executor():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_DECODE_WORKERS,
+                initializer=_setup_worker,
+                initargs=(settings.RECIPE_IMAGE_MAX_PIXELS,)
+            )
+            _slots = BoundedSemaphore(settings.IMAGE_DECODE_WORKERS * 2)
+        return _executor
+
+
+def process_image(data, is_base64):
+    """Разобрать изображение в пуле: (байты, расширение)
+
+    data — строка base64 или загруженный файл.
+    """
+    executor = get_executor()
+    slots = _slots
+    if not slots.acquire(timeout=settings.IMAGE_DECODE_TIMEOUT):
+        raise ImageDecodeBusy()
+    try:
+        path, owned = spool_upload(
+            data, is_base64, settings.RECIPE_IMAGE_MAX_BYTES
+        )
+    except BaseException:
+        slots.release()
+        raise
+
+    def finished(future=None):
+        if owned:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        slots.release()
+
+    try:
+        future = executor.submit(
+            decode_image, path,
+            settings.RECIPE_IMAGE_MAX_BYTES,
+            settings.RECIPE_IMAGE_MAX_PIXELS,
+            settings.RECIPE_IMAGE_MAX_SIDE
+        )
+    except BaseException:
+        finished()
+        raise
+    # Слот и файл освобождаются по завершении задачи, а не запроса
+    future.add_done_callback(finished)
+    try:
+        return future.result(timeout=settings.IMAGE_DECODE_TIMEOUT)
+    except FutureTimeout:
+        # Уже запущенная задача не прерывается, отменится только
+        # ещё не начатая
+        future.cancel()
+        raise ImageDecodeBusy()
@@ -0,0 +1,255 @@
+import heapq
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+from itertools import groupby
+from threading import Lock
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import IngredientsRecipe, MeCategory, MeIngredient
+from .versions import (
+    CATEGORIES_VERSION, INGREDIENTS_VERSION, RECIPE_INGREDIENTS_VERSION,
+    changes_since, get_version, log_change)
+
+
+class IngredientPrefixIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения
+
+    Названия хранятся отсортированными в casefold, поиск по префиксу —
+    бинарный поиск и проход вперёд до первого несовпадения. Индекс
+    перестраивается при смене версии INGREDIENTS_VERSION.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._snapshot = ([], [])
+
+    def build(self):
+        rows = sorted(
+            # Индекс помечается текущей версией, поэтому читается
+            # основная база, а не отстающая реплика
+            MeIngredient.objects.using(DEFAULT_DB_ALIAS).values_list(
+                'name', 'unit_of_measure', 'id'),
+            key=lambda row: (row[0].casefold(), row[2])
+        )
+        self._snapshot = (
+            [name.casefold() for name, _, _ in rows],
+            [
+                {'id': pk, 'name': name, 'unit_of_measure': unit}
+                for name, unit, pk in rows
+            ]
+        )
+
+    def stale(self):
+        """Нужна ли пересборка, без обращения к базе"""
+        return get_version(INGREDIENTS_VERSION) != self._version
+
+    def refresh(self):
+        version = get_version(INGREDIENTS_VERSION)
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self.build()
+                self._version = version
+
+    def search(self, prefix='', limit=None):
+        """Ингредиенты, название которых начинается с prefix"""
+        self.refresh()
+        keys, rows = self._snapshot
+        prefix = prefix.casefold()
+        result = []
+        for position in range(bisect_left(keys, prefix), len(keys)):
+            if limit is not None and len(result) >= limit:
+                break
+            if not keys[position].startswith(prefix):
+                break
+            result.append(rows[position])
+        return result
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+class CategorySnapshot:
+    """Таблица категорий в памяти процесса
+
+    Категорий немного и меняются они редко, поэтому список для /tags/
+    и соответствие slug → id берутся из снимка. Снимок собирается
+    заново при смене версии CATEGORIES_VERSION.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._snapshot = ([], {}, {})
+
+    def build(self):
+        rows = list(
+            MeCategory.objects.using(DEFAULT_DB_ALIAS).order_by('id').values(
+                'id', 'name_category', 'slug', 'color'
+            )
+        )
+        self._snapshot = (
+            rows,
+            {row['id']: row for row in rows},
+            {row['slug']: row['id'] for row in rows},
+        )
+
+    def refresh(self):
+        version = get_version(CATEGORIES_VERSION)
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self.build()
+                self._version = version
+
+    def rows(self):
+        self.refresh()
+        return self._snapshot[0]
+
+    def get(self, pk):
+        self.refresh()
+        return self._snapshot[1].get(pk)
+
+    def ids(self, slugs):
+        """id категорий по слагам, неизвестные слаги пропускаются"""
+        self.refresh()
+        ids_by_slug = self._snapshot[2]
+        return [ids_by_slug[slug] for slug in slugs if slug in ids_by_slug]
+
+    def choices(self):
+        return [(row['slug'], row['name_category']) for row in self.rows()]
+
+
+category_snapshot = CategorySnapshot()
+
+
+class RecipeIngredientIndex:
+    """Обратный индекс ингредиент → рецепты для подбора по продуктам
+
+    Для каждого ингредиента хранится отсортированный array с id рецептов,
+    для рецепта — только число его ингредиентов, в array по id рецепта.
+    Изменённые рецепты переиндексируются по журналу
+    RECIPE_INGREDIENTS_VERSION, полная сборка нужна при первом обращении,
+    пропуске в журнале и больших пакетах изменений. Словарь и массивы
+    заменяются копиями одной парой _state, поэтому поиск читает их без
+    блокировки.
+    """
+
+    # Больше изменённых рецептов дешевле собрать индекс заново
+    APPLY_LIMIT = 200
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._state = ({}, array('H'))
+
+    def build(self):
+        postings = defaultdict(lambda: array('q'))
+        totals = array('H')
+        rows = IngredientsRecipe.objects.using(DEFAULT_DB_ALIAS).order_by(
+            'name_recipe_id', 'name_ingredients_id'
+        ).values_list('name_recipe_id', 'name_ingredients_id')
+        for recipe, ingredient in rows.iterator(chunk_size=10000):
+            posting = postings[ingredient]
+            if not posting or posting[-1] != recipe:
+                posting.append(recipe)
+                if recipe >= len(totals):
+                    totals.extend([0] * (recipe + 1 - len(totals)))
+                totals[recipe] += 1
+        self._state = (dict(postings), totals)
+
+    def apply(self, recipe_ids):
+        """Переиндексация только перечисленных рецептов
+
+        Прежний состав рецепта не хранится, он восстанавливается
+        бинарным поиском по спискам ингредиентов.
+        """
+        current = defaultdict(set)
+        rows = IngredientsRecipe.objects.using(DEFAULT_DB_ALIAS).filter(
+            name_recipe_id__in=recipe_ids
+        ).values_list('name_recipe_id', 'name_ingredients_id')
+        for recipe, ingredient in rows:
+            current[recipe].add(ingredient)
+        postings, totals = self._state
+        previous = defaultdict(set)
+        for ingredient, posting in postings.items():
+            for recipe in recipe_ids:
+                position = bisect_left(posting, recipe)
+                if position < len(posting) and posting[position] == recipe:
+                    previous[recipe].add(ingredient)
+        postings, totals = dict(postings), array('H', totals)
+        for recipe in recipe_ids:
+            old = previous.get(recipe, set())
+            new = current.get(recipe, set())
+            for ingredient in old - new:
+                posting = array('q', postings[ingredient])
+                del posting[bisect_left(posting, recipe)]
+                if posting:
+                    postings[ingredient] = posting
+                else:
+                    del postings[ingredient]
+            for ingredient in new - old:
+                posting = array('q', postings.get(ingredient, ()))
+                insort(posting, recipe)
+                postings[ingredient] = posting
+            if recipe >= len(totals):
+                totals.extend([0] * (recipe + 1 - len(totals)))
+            totals[recipe] = len(new)
+        self._state = (postings, totals)
+
+    def refresh(self):
+        version = get_version(RECIPE_INGREDIENTS_VERSION)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            changed = changes_since(
+                RECIPE_INGREDIENTS_VERSION, self._version, version
+            )
+            if changed is None or len(set(changed)) > self.APPLY_LIMIT:
+                self.build()
+            else:
+                self.apply(set(changed))
+            self._version = version
+
+    def search(self, ingredient_ids, missing=None):
+        """Рецепты по доле своих ингредиентов, которые есть в наличии
+
+        Возвращает кортежи (id рецепта, найдено, всего) по убыванию
+        покрытия. missing — сколько ингредиентов рецепта может не хватать.
+        Отсортированные списки сливаются потоком, поэтому в памяти
+        остаются только подходящие рецепты.
+        """
+        self.refresh()
+        postings, totals = self._state
+        merged = heapq.merge(*(
+            postings[ingredient] for ingredient in set(ingredient_ids)
+            if ingredient in postings
+        ))
+        result = []
+        for recipe, group in groupby(merged):
+            total = totals[recipe] if recipe < len(totals) else 0
+            if not total:
+                continue
+            count = sum(1 for _ in group)
+            if missing is not None and total - count > missing:
+                continue
+            result.append((recipe, count, total))
+        result.sort(key=lambda row: (-row[1] / row[2], -row[1], -row[0]))
+        return result
+
+
+def recipe_ingredients_changed(recipe_id):
+    """Запись в журнал индекса после фиксации транзакции"""
+    transaction.on_commit(
+        lambda: log_change(RECIPE_INGREDIENTS_VERSION, recipe_id)
+    )
+
+
+recipe_index = RecipeIngredientIndex()
@@ -0,0 +1,105 @@
+"""Общие помощники команд замера: временные данные и подсчёт запросов"""
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.models import MeFollow, MeUser
+from recipe.models import (
+    IngredientsRecipe, MeCategory, MeIngredient, MeRecipe, Select,
+    ShoppingList)
+
+INGREDIENTS_PER_RECIPE = 8
+RECIPES_PER_AUTHOR = 5
+PREFIX = 'bench'
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Всё, что сделано внутри блока, откатывается"""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+@contextmanager
+def count_queries():
+    """Список SQL, выполненных внутри блока, без ограничения DEBUG-лога"""
+    queries = []
+
+    def wrapper(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield queries
+
+
+def seed(size):
+    """Пользователь с size рецептами в корзине и избранном
+
+    Рецепты распределены между авторами по RECIPES_PER_AUTHOR, на половину
+    авторов пользователь подписан. Вызывать внутри rolled_back().
+    """
+    now = timezone.now()
+    user = MeUser.objects.create_user(
+        username=PREFIX, email=f'{PREFIX}@example.com', password=None
+    )
+    MeUser.objects.bulk_create([
+        MeUser(username=f'{PREFIX}_{i}', email=f'{PREFIX}_{i}@example.com')
+        for i in range(max(1, size // RECIPES_PER_AUTHOR))
+    ])
+    authors = list(MeUser.objects.filter(username__startswith=f'{PREFIX}_'))
+    MeFollow.objects.bulk_create([
+        MeFollow(user=user, author=author) for author in authors[::2]
+    ])
+    MeCategory.objects.bulk_create([
+        MeCategory(name_category=f'{PREFIX} {i}', slug=f'{PREFIX}-{i}')
+        for i in range(3)
+    ])
+    tags = list(MeCategory.objects.filter(slug__startswith=f'{PREFIX}-'))
+    MeIngredient.objects.bulk_create([
+        MeIngredient(name=f'{PREFIX} {i}', unit_of_measure='г')
+        for i in range(INGREDIENTS_PER_RECIPE * 4)
+    ])
+    ingredients = list(
+        MeIngredient.objects.filter(name__startswith=f'{PREFIX} ')
+    )
+    # bulk_create возвращает pk не на всех бэкендах, поэтому перечитываем
+    MeRecipe.objects.bulk_create([
+        MeRecipe(
+            name_recipe=f'{PREFIX} {i}', author=authors[i % len(authors)],
+            discriptions=PREFIX, illustration=f'{PREFIX}.png',
+            data=now - timedelta(minutes=i), time=1
+        ) for i in range(size)
+    ])
+    recipes = list(MeRecipe.objects.filter(author__in=authors))
+    IngredientsRecipe.objects.bulk_create([
+        IngredientsRecipe(
+            name_recipe=recipe,
+            name_ingredients=ingredients[(i + j) % len(ingredients)],
+            quantity=j + 1
+        )
+        for i, recipe in enumerate(recipes)
+        for j in range(INGREDIENTS_PER_RECIPE)
+    ])
+    MeRecipe.tags.through.objects.bulk_create([
+        MeRecipe.tags.through(merecipe=recipe, mecategory=tag)
+        for i, recipe in enumerate(recipes)
+        for tag in (tags[i % len(tags)], tags[(i + 1) % len(tags)])
+    ])
+    Select.objects.bulk_create([
+        Select(user=user, name_recipe=recipe, data=now) for recipe in recipes
+    ])
+    ShoppingList.objects.bulk_create([
+        ShoppingList(user=user, recipe=recipe, data=now) for recipe in recipes
+    ])
+    return user
@@ -0,0 +1,49 @@
+from django.core.management.base import CommandError
+from django.db import connection
+
+from recipe.models import MeCategory, MeIngredient
+
+from .bench_servers import Command as ServersCommand
+
+WSGI = ['foodgram.wsgi:application']
+
+
+class Command(ServersCommand):
+    help = (
+        'Нагрузочное сравнение подключения на каждый запрос, '
+        'CONN_MAX_AGE и пула соединений на локальном PostgreSQL'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Потоков gthread на воркер, больше размера пула'
+        )
+        parser.add_argument('--pool-size', type=int, default=4)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Замер имеет смысл только на PostgreSQL')
+        super().handle(*args, **options)
+
+    def variants(self, options):
+        arguments = ['--threads', str(options['threads'])] + WSGI
+        return {
+            'direct': (
+                arguments, {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '0'}
+            ),
+            'persistent': (
+                arguments, {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '60'}
+            ),
+            'pool': (arguments, {
+                'DB_POOL': 'True', 'DB_POOL_SIZE': str(options['pool_size'])
+            }),
+        }
+
+    def default_paths(self):
+        """Маршруты без кэша ответов: каждый запрос идёт в базу"""
+        ingredient = MeIngredient.objects.order_by('id').first()
+        if ingredient is None or not MeCategory.objects.exists():
+            raise CommandError('Нет данных, сначала выполните seed_scale')
+        return ['/recipe/tags/', f'/recipe/ingredients/{ingredient.id}/']
@@ -0,0 +1,79 @@
+import base64
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from recipe import images
+from recipe.fields import ImageDecodeUnavailable, InlineImageField
+
+
+def peak_rss(pid):
+    """Пиковый RSS процесса в МиБ по /proc (только Linux)"""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Наплыв одновременных загрузок фото и память пула декодирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=64)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--width', type=int, default=3000)
+        parser.add_argument('--height', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        data_url = self.make_payload(options['width'], options['height'])
+        field = InlineImageField()
+        results = {'ok': 0, 'rejected': 0, 'busy': 0}
+
+        def upload(_):
+            try:
+                field.to_internal_value(data_url)
+                return 'ok'
+            except ValidationError:
+                return 'rejected'
+            except ImageDecodeUnavailable:
+                return 'busy'
+
+        images.get_executor()
+        start = perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            for result in pool.map(upload, range(options['uploads'])):
+                results[result] += 1
+        elapsed = perf_counter() - start
+
+        self.stdout.write(
+            f'{options["uploads"]} загрузок '
+            f'по {len(data_url) / 2**20:.1f} МиБ, '
+            f'{options["concurrency"]} одновременно: {elapsed:.1f} с, '
+            f'успешно {results["ok"]}, отклонено {results["rejected"]}, '
+            f'пул занят {results["busy"]}'
+        )
+        for pid in images.get_executor()._processes:
+            self.stdout.write(
+                f'процесс пула {pid}: пик RSS {peak_rss(pid):.1f} МиБ'
+            )
+        self.stdout.write(
+            f'процесс запросов: пик RSS {peak_rss(os.getpid()):.1f} МиБ'
+        )
+
+    def make_payload(self, width, height):
+        image = Image.frombytes(
+            'RGB', (width, height), os.urandom(width * height * 3)
+        )
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        encoded = base64.b64encode(buffer.getvalue()).decode()
+        return f'data:image/jpeg;base64,{encoded}'
@@ -0,0 +1,75 @@
+import csv
+import tracemalloc
+from statistics import median
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipe.index import IngredientPrefixIndex
+from recipe.models import MeIngredient
+
+from ._bench import rolled_back
+
+
+class Command(BaseCommand):
+    help = 'Задержка и память индекса автодополнения ингредиентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=str(settings.BASE_DIR.parent / 'data' / 'ingredients.csv'),
+            help='Каталог для заполнения пустой таблицы на время замера'
+        )
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            if not MeIngredient.objects.exists():
+                self.seed(options['path'])
+            self.run(options['limit'])
+
+    def seed(self, path):
+        with open(path, encoding='utf-8') as file:
+            MeIngredient.objects.bulk_create(
+                MeIngredient(name=name, unit_of_measure=unit)
+                for name, unit in csv.reader(file)
+            )
+
+    def run(self, limit):
+        index = IngredientPrefixIndex()
+        tracemalloc.start()
+        start = perf_counter()
+        index.refresh()
+        build = perf_counter() - start
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        keys, _ = index._snapshot
+        prefixes = sorted({
+            key[:length] for key in keys for length in (1, 2, 3)
+        })
+        self.stdout.write(
+            f'{len(keys)} ингредиентов: сборка {build * 1000:.1f} мс, '
+            f'память {memory / 1024:.0f} КиБ, {len(prefixes)} префиксов'
+        )
+
+        memory_timings = []
+        for prefix in prefixes:
+            start = perf_counter()
+            index.search(prefix, limit)
+            memory_timings.append(perf_counter() - start)
+        db_timings = []
+        for prefix in prefixes[::10]:
+            start = perf_counter()
+            list(MeIngredient.objects.filter(
+                name__istartswith=prefix)[:limit])
+            db_timings.append(perf_counter() - start)
+
+        for label, timings in (('индекс', memory_timings),
+                               ('база', db_timings)):
+            timings.sort()
+            self.stdout.write(
+                f'{label}: медиана {median(timings) * 1e6:.1f} мкс, '
+                f'p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f} мкс'
+            )
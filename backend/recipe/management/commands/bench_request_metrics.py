@@ -0,0 +1,49 @@
+from statistics import median
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+METRICS_MIDDLEWARE = 'foodgram.middleware.RequestMetricsMiddleware'
+
+
+class Command(BaseCommand):
+    help = 'Накладные расходы RequestMetricsMiddleware на запрос'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', action='append',
+            help='Адрес для замера, можно указать несколько раз'
+        )
+        parser.add_argument('--requests', type=int, default=500)
+
+    def handle(self, *args, **options):
+        paths = options['path'] or [
+            '/recipe/tags/', '/recipe/ingredients/?name=а',
+            '/recipe/recipes/',
+        ]
+        without = [
+            middleware for middleware in settings.MIDDLEWARE
+            if middleware != METRICS_MIDDLEWARE
+        ]
+        client = Client(HTTP_HOST='localhost')
+        for path in paths:
+            with override_settings(MIDDLEWARE=without):
+                plain = self.measure(client, path, options['requests'])
+            with override_settings(MIDDLEWARE=[METRICS_MIDDLEWARE, *without]):
+                timed = self.measure(client, path, options['requests'])
+            self.stdout.write(
+                f'{path}: без метрик {plain * 1e6:.0f} мкс, '
+                f'с метриками {timed * 1e6:.0f} мкс, '
+                f'разница {(timed - plain) * 1e6:+.0f} мкс'
+            )
+
+    def measure(self, client, path, requests):
+        client.get(path)
+        timings = []
+        for _ in range(requests):
+            start = perf_counter()
+            client.get(path)
+            timings.append(perf_counter() - start)
+        return median(timings)
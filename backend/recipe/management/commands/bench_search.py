@@ -0,0 +1,64 @@
+import random
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from recipe.models import MeRecipe
+from recipe.search import search_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Задержка полнотекстового поиска рецептов. Данные готовит '
+        'seed_scale, например --recipes 1000000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        total = MeRecipe.objects.count()
+        if not total:
+            raise CommandError('Рецептов нет, сначала выполните seed_scale')
+        queries = self.sample_queries(rng, options['queries'])
+        self.stdout.write(
+            f'{connection.vendor}: {total} рецептов, {len(queries)} запросов'
+        )
+        limit = options['limit']
+        for label, run in (
+            ('страница', lambda text: list(
+                search_recipes(MeRecipe.objects.all(), text)[:limit])),
+            ('count', lambda text: search_recipes(
+                MeRecipe.objects.all(), text).count()),
+        ):
+            timings = []
+            for text in queries:
+                start = perf_counter()
+                run(text)
+                timings.append(perf_counter() - start)
+            timings.sort()
+            self.stdout.write(
+                f'{label}: медиана {median(timings) * 1000:.1f} мс, '
+                f'p95 {timings[int(len(timings) * 0.95)] * 1000:.1f} мс'
+            )
+
+    def sample_queries(self, rng, count):
+        """Одно- и двухсловные запросы из слов существующих названий"""
+        names = MeRecipe.objects.order_by('?').values_list(
+            'name_recipe', flat=True)[:count]
+        queries = []
+        for name in names:
+            words = [
+                word for word in name.split()
+                if word.isalpha() and len(word) > 2
+            ]
+            if words:
+                queries.append(' '.join(
+                    rng.sample(words, min(len(words), rng.randint(1, 2)))
+                ))
+        return queries
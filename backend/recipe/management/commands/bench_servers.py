@@ -0,0 +1,205 @@
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import threading
+from http.client import HTTPConnection
+from importlib.util import find_spec
+from time import perf_counter, sleep
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recipe.models import MeIngredient, MeRecipe
+
+SERVERS = {
+    'wsgi': (['foodgram.wsgi:application'], 'False'),
+    'asgi': ([
+        '-k', 'uvicorn.workers.UvicornWorker', 'foodgram.asgi:application'
+    ], 'True'),
+}
+
+
+def percentile(timings, share):
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочное сравнение WSGI и ASGI при одинаковом числе '
+        'воркеров gunicorn на горячих GET-маршрутах'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность нагрузки на каждый сервер, с'
+        )
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--paths', nargs='+',
+            help='Адреса для нагрузки, по умолчанию лента, рецепт '
+                 'и автодополнение'
+        )
+        parser.add_argument('--output', help='Куда записать результаты')
+        parser.add_argument(
+            'servers', nargs='*',
+            help=f'Из {", ".join(SERVERS)}, по умолчанию все'
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self.default_paths()
+        results = {}
+        for name, (arguments, env) in self.variants(options).items():
+            with self.server(
+                arguments, env, options['workers'], options['port']
+            ):
+                self.load(options['port'], paths, 1, 1)
+                results[name] = self.load(
+                    options['port'], paths,
+                    options['concurrency'], options['duration']
+                )
+            self.print_result(name, results[name])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'created': timezone.now().isoformat(),
+                    'python': platform.python_version(),
+                    'workers': options['workers'],
+                    'concurrency': options['concurrency'],
+                    'paths': paths,
+                    'results': results,
+                }, file, ensure_ascii=False, indent=2)
+
+    def default_paths(self):
+        recipe = MeRecipe.objects.order_by('-data', '-id').first()
+        ingredient = MeIngredient.objects.order_by('id').first()
+        if recipe is None or ingredient is None:
+            raise CommandError('Нет данных, сначала выполните seed_scale')
+        return [
+            '/recipe/recipes/',
+            f'/recipe/recipes/{recipe.id}/',
+            f'/recipe/ingredients/?name={quote(ingredient.name[:2])}',
+        ]
+
+    def variants(self, options):
+        """Сравниваемые запуски: аргументы gunicorn и окружение"""
+        servers = options['servers'] or list(SERVERS)
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f'Неизвестные серверы: {", ".join(unknown)}')
+        if 'asgi' in servers and not find_spec('uvicorn'):
+            raise CommandError('Для ASGI нужен uvicorn из requirements.txt')
+        return {
+            name: (SERVERS[name][0], {'ASYNC_HOT_PATHS': SERVERS[name][1]})
+            for name in servers
+        }
+
+    def server(self, arguments, env, workers, port):
+        command = [
+            sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+            '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+        ] + arguments
+        return RunningServer(command, dict(os.environ, **env), port)
+
+    def load(self, port, paths, concurrency, duration):
+        """Клиенты с keep-alive по кругу запрашивают paths"""
+        deadline = perf_counter() + duration
+        timings = []
+        errors = []
+        lock = threading.Lock()
+
+        def client(offset):
+            connection = HTTPConnection('127.0.0.1', port, timeout=30)
+            local, failed = [], 0
+            number = offset
+            while perf_counter() < deadline:
+                path = paths[number % len(paths)]
+                number += 1
+                start = perf_counter()
+                try:
+                    connection.request('GET', path)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        failed += 1
+                        continue
+                except OSError:
+                    failed += 1
+                    connection.close()
+                    continue
+                local.append(perf_counter() - start)
+            connection.close()
+            with lock:
+                timings.extend(local)
+                errors.append(failed)
+
+        threads = [
+            threading.Thread(target=client, args=(offset,))
+            for offset in range(concurrency)
+        ]
+        start = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - start
+        timings.sort()
+        if not timings:
+            raise CommandError('Сервер не ответил ни на один запрос')
+        return {
+            'requests': len(timings),
+            'errors': sum(errors),
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+        }
+
+    def print_result(self, name, result):
+        self.stdout.write(
+            f'{name}: {result["rps"]} запросов/с, '
+            f'p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс, '
+            f'p99 {result["p99_ms"]} мс, ошибок {result["errors"]}'
+        )
+
+
+class RunningServer:
+    """gunicorn в дочернем процессе на время блока with"""
+
+    def __init__(self, command, env, port, timeout=30):
+        self.command = command
+        self.env = env
+        self.port = port
+        self.timeout = timeout
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            self.command, env=self.env, cwd=settings.BASE_DIR
+        )
+        deadline = perf_counter() + self.timeout
+        while perf_counter() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError('Сервер завершился при запуске')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), 1).close()
+                return self
+            except OSError:
+                sleep(0.2)
+        self.__exit__()
+        raise CommandError('Сервер не запустился')
+
+    def __exit__(self, *exc_info):
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(self.timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
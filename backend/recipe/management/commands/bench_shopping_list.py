@@ -0,0 +1,96 @@
+from collections import defaultdict
+from functools import partial
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipe.models import ShoppingList
+from recipe.utils import (
+    generate_csv_shopping_list,
+    generate_pdf_shopping_list,
+    generate_shopping_list,
+    generate_txt_shopping_list
+)
+
+from ._bench import count_queries, rolled_back, seed
+
+RENDERERS = {
+    'txt': generate_txt_shopping_list,
+    'csv': generate_csv_shopping_list,
+    'pdf': lambda user: iter(
+        partial(generate_pdf_shopping_list(user).read, 8192), b''),
+}
+# Сколько фрагментов заголовка отдаётся до запроса строк
+HEADER_CHUNKS = {'txt': 1, 'csv': 1, 'pdf': 0}
+
+
+def naive_shopping_list(user):
+    """Прежний вариант: обход корзины с запросом на каждый рецепт"""
+    shopping_cart = ShoppingList.objects.filter(
+        user=user).select_related('recipe')
+    ingredients = defaultdict(lambda: {'amount': 0, 'unit': ''})
+    for item in shopping_cart:
+        for ri in item.recipe.recipe_ingredients.all():
+            key = ri.name_ingredients.name
+            ingredients[key]['amount'] += ri.quantity
+            ingredients[key]['unit'] = ri.name_ingredients.unit_of_measure
+    return ingredients
+
+
+class Command(BaseCommand):
+    help = 'Сравнение старой и новой сборки списка покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[10, 100, 1000],
+            help='Количество рецептов в корзине'
+        )
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            with rolled_back():
+                user = seed(size)
+                self.report(size, 'old', options['repeat'],
+                            lambda: naive_shopping_list(user))
+                self.report(size, 'new', options['repeat'],
+                            lambda: list(generate_shopping_list(user)))
+                for label, render in RENDERERS.items():
+                    self.report_ttfb(size, label, options['repeat'],
+                                     lambda: render(user),
+                                     HEADER_CHUNKS[label])
+
+    def report(self, size, label, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            with count_queries() as queries:
+                start = perf_counter()
+                func()
+                timings.append(perf_counter() - start)
+        self.stdout.write(
+            f'{size:>6} рецептов  {label}: '
+            f'{min(timings) * 1000:9.2f} мс, '
+            f'{len(queries)} запросов'
+        )
+
+    def report_ttfb(self, size, label, repeat, func, header_chunks):
+        """Время до первой строки списка и до конца выгрузки
+
+        Заголовок отдаётся до запроса к базе, поэтому первым байтом
+        считается фрагмент с первой строкой.
+        """
+        first, total = [], []
+        for _ in range(repeat):
+            start = perf_counter()
+            chunks = func()
+            for _ in range(header_chunks + 1):
+                next(chunks)
+            first.append(perf_counter() - start)
+            for _ in chunks:
+                pass
+            total.append(perf_counter() - start)
+        self.stdout.write(
+            f'{size:>6} рецептов  {label}: '
+            f'первая строка {min(first) * 1000:9.2f} мс, '
+            f'всего {min(total) * 1000:9.2f} мс'
+        )
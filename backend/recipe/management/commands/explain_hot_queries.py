@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.models import MeFollow
+from recipe.models import (
+    MeIngredient, MeRecipe, Select, ShoppingList)
+
+from ._bench import rolled_back
+
+INGREDIENT_PREFIX_INDEX = 'ingredient_name_upper_idx'
+
+
+class Command(BaseCommand):
+    help = (
+        'Планы горячих запросов с индексами и без них. На PostgreSQL '
+        'индексы удаляются внутри транзакции, которая затем откатывается'
+    )
+
+    def handle(self, *args, **options):
+        queries = self.hot_queries()
+        if connection.vendor == 'postgresql':
+            with rolled_back():
+                self.drop_indexes()
+                self.stdout.write(self.style.MIGRATE_HEADING('Без индексов'))
+                self.explain(queries)
+        else:
+            self.stdout.write(self.style.WARNING(
+                'Сравнение без индексов доступно только на PostgreSQL'
+            ))
+        self.stdout.write(self.style.MIGRATE_HEADING('С индексами'))
+        self.explain(queries)
+
+    def hot_queries(self):
+        favorite = Select.objects.first()
+        cart = ShoppingList.objects.first()
+        follow = MeFollow.objects.first()
+        ingredient = MeIngredient.objects.first()
+        if not all((favorite, cart, follow, ingredient)):
+            raise CommandError(
+                'Нужна заполненная база: избранное, корзина, '
+                'подписки и ингредиенты'
+            )
+        return {
+            'избранное (user, recipe)': Select.objects.filter(
+                user=favorite.user_id, name_recipe=favorite.name_recipe_id
+            ),
+            'корзина (user, recipe)': ShoppingList.objects.filter(
+                user=cart.user_id, recipe=cart.recipe_id
+            ),
+            'подписка (user, author)': MeFollow.objects.filter(
+                user=follow.user_id, author=follow.author_id
+            ),
+            'лента рецептов': MeRecipe.objects.order_by('-data', '-id')[:6],
+            'ингредиенты по префиксу': MeIngredient.objects.filter(
+                name__istartswith=ingredient.name[:2]
+            ),
+        }
+
+    def explain(self, queries):
+        options = {}
+        if connection.vendor == 'postgresql':
+            options = {'analyze': True}
+        for title, queryset in queries.items():
+            self.stdout.write(self.style.SQL_KEYWORD(title))
+            self.stdout.write(queryset.explain(**options))
+            self.stdout.write('')
+
+    def drop_indexes(self):
+        with connection.schema_editor(atomic=False) as editor:
+            for model, constraint_name in (
+                (Select, 'unique_favorite'),
+                (MeFollow, 'unique_follow'),
+            ):
+                constraint = next(
+                    constraint for constraint in model._meta.constraints
+                    if constraint.name == constraint_name
+                )
+                editor.remove_constraint(model, constraint)
+            editor.remove_index(MeRecipe, MeRecipe._meta.indexes[0])
+            editor.execute(f'DROP INDEX {INGREDIENT_PREFIX_INDEX}')
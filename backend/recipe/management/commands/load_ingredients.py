@@ -0,0 +1,164 @@
+import csv
+import json
+from io import StringIO
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipe.models import MeIngredient
+from recipe.versions import INGREDIENTS_VERSION, bump_version
+
+READ_SIZE = 64 * 1024
+# Сколько номеров пропущенных записей выводить
+SKIPPED_SHOWN = 10
+
+
+def read_csv(file, skipped):
+    """Строки «название, единица»; неполные попадают в skipped"""
+    for number, row in enumerate(csv.reader(file), 1):
+        if not row:
+            continue
+        if len(row) < 2 or not row[0].strip():
+            skipped.append(number)
+            continue
+        yield row[0].strip(), row[1].strip()
+
+
+def read_json(file, skipped):
+    """Потоковый разбор JSON-массива без загрузки файла целиком"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    number = 0
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидается JSON-массив')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError('Файл JSON оборван')
+                break
+            number += 1
+            if not (
+                isinstance(item, dict)
+                and isinstance(item.get('name'), str)
+                and isinstance(item.get('measurement_unit'), str)
+                and item['name'].strip()
+            ):
+                skipped.append(number)
+                continue
+            yield item['name'].strip(), item['measurement_unit'].strip()
+        buffer = buffer[position:]
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Загрузка каталога ингредиентов из CSV или JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к ingredients.csv или .json')
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат файла, по умолчанию по расширению'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже на PostgreSQL'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path.name}')
+        use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        load = self.copy if use_copy else self.bulk_create
+
+        skipped = []
+        start = perf_counter()
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            read, created = load(
+                READERS[file_format](file, skipped), options['batch_size']
+            )
+        elapsed = perf_counter() - start
+        bump_version(INGREDIENTS_VERSION)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {read}, добавлено {created} ингредиентов '
+            f'за {elapsed:.2f} с ({read / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
+        if skipped:
+            shown = ', '.join(map(str, skipped[:SKIPPED_SHOWN]))
+            more = '…' if len(skipped) > SKIPPED_SHOWN else ''
+            self.stderr.write(self.style.WARNING(
+                f'Пропущено {len(skipped)} неполных записей: {shown}{more}'
+            ))
+
+    def bulk_create(self, rows, batch_size):
+        before = MeIngredient.objects.count()
+        read = 0
+        for batch in batches(rows, batch_size):
+            read += len(batch)
+            MeIngredient.objects.bulk_create(
+                [MeIngredient(name=name, unit_of_measure=unit)
+                 for name, unit in batch],
+                ignore_conflicts=True
+            )
+        return read, MeIngredient.objects.count() - before
+
+    def copy(self, rows, batch_size):
+        """COPY во временную таблицу и одна вставка ON CONFLICT DO NOTHING"""
+        table = MeIngredient._meta.db_table
+        read = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredients_load '
+                '(name varchar(70), unit_of_measure varchar(70)) '
+                'ON COMMIT DROP'
+            )
+            for batch in batches(rows, batch_size):
+                read += len(batch)
+                buffer = StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredients_load FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+            cursor.execute(
+                f'INSERT INTO {table} (name, unit_of_measure) '
+                'SELECT DISTINCT name, unit_of_measure FROM ingredients_load '
+                'ON CONFLICT (name, unit_of_measure) DO NOTHING'
+            )
+            created = cursor.rowcount
+        return read, created
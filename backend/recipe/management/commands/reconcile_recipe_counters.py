@@ -0,0 +1,20 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipe.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков избранного и корзины у рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        fixed = reconcile(options['batch_size'])
+        elapsed = perf_counter() - start
+        for field, count in fixed.items():
+            self.stdout.write(f'{field}: исправлено {count} рецептов')
+        self.stdout.write(f'Проверка заняла {elapsed:.1f} с')
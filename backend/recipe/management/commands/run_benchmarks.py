@@ -0,0 +1,159 @@
+import json
+import platform
+from statistics import median
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.models import MeUser
+from api.serializers import MeUserSerializer
+from recipe.filters import RecipeFilter
+from recipe.models import MeCategory, MeRecipe
+from recipe.serializers import RecipeReadSerializer
+from recipe.utils import (
+    generate_pdf_shopping_list,
+    generate_shopping_list,
+    generate_txt_shopping_list
+)
+from recipe.views import MeRecipeViewSet
+
+from ._bench import PREFIX, count_queries, rolled_back, seed
+
+
+# Адреса картинок строятся от хоста запроса, он должен быть разрешён
+BENCH_HOST = 'localhost'
+
+
+def make_request(user):
+    request = Request(APIRequestFactory().get('/', HTTP_HOST=BENCH_HOST))
+    request.user = user
+    return request
+
+
+def cases(user):
+    """Замеряемые функции для пользователя из seed()"""
+    request = make_request(user)
+    context = {'request': request}
+    view = MeRecipeViewSet(request=request, action='list', format_kwarg=None)
+    tag = MeCategory.objects.filter(slug__startswith=PREFIX).first()
+    author = MeUser.objects.filter(username__startswith=f'{PREFIX}_').first()
+    return {
+        'recipe_serializer': lambda: RecipeReadSerializer(
+            view.get_queryset(), many=True, context=context
+        ).data,
+        'user_serializer': lambda: MeUserSerializer(
+            MeUser.objects.filter(username__startswith=PREFIX),
+            many=True, context=context
+        ).data,
+        'recipe_filter': lambda: list(RecipeFilter(
+            {'tags': [tag.slug], 'author': author.id},
+            queryset=MeRecipe.objects.all()
+        ).qs),
+        'shopping_list': lambda: list(generate_shopping_list(user)),
+        'shopping_list_txt': lambda: ''.join(
+            generate_txt_shopping_list(user)),
+        'shopping_list_pdf': lambda: generate_pdf_shopping_list(user).read(),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Набор замеров сериализаторов, фильтров и списка покупок '
+        'с сохранением результатов в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[10, 100, 1000],
+            help='Количество рецептов в тестовых данных'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='Куда записать результаты')
+        parser.add_argument('--baseline', help='Результаты для сравнения')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимое замедление относительно baseline'
+        )
+        parser.add_argument(
+            'benchmarks', nargs='*',
+            help='Запустить только указанные замеры'
+        )
+
+    def handle(self, *args, **options):
+        results = {}
+        allowed_hosts = [*settings.ALLOWED_HOSTS, BENCH_HOST]
+        for size in options['sizes']:
+            with override_settings(ALLOWED_HOSTS=allowed_hosts), \
+                    rolled_back():
+                user = seed(size)
+                for name, func in cases(user).items():
+                    selected = options['benchmarks']
+                    if selected and name not in selected:
+                        continue
+                    results.setdefault(name, {})[str(size)] = self.measure(
+                        func, options['repeat']
+                    )
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'vendor': connection.vendor,
+            'python': platform.python_version(),
+            'results': results,
+        }
+        self.print_results(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['threshold'])
+
+    def measure(self, func, repeat):
+        func()
+        timings = []
+        for _ in range(repeat):
+            with count_queries() as queries:
+                start = perf_counter()
+                func()
+                timings.append(perf_counter() - start)
+        return {
+            'median_ms': round(median(timings) * 1000, 3),
+            'min_ms': round(min(timings) * 1000, 3),
+            'queries': len(queries),
+        }
+
+    def print_results(self, results):
+        for name, sizes in results.items():
+            for size, result in sizes.items():
+                self.stdout.write(
+                    f'{name:<20} {size:>6}: {result["median_ms"]:10.3f} мс, '
+                    f'{result["queries"]} запросов'
+                )
+
+    def compare(self, results, path, threshold):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        regressions = []
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Сравнение с {path}'))
+        for name, sizes in results.items():
+            for size, result in sizes.items():
+                previous = baseline.get(name, {}).get(size)
+                if previous is None:
+                    continue
+                ratio = result['median_ms'] / max(previous['median_ms'], 1e-6)
+                line = (
+                    f'{name:<20} {size:>6}: x{ratio:.2f}, запросов '
+                    f'{previous["queries"]} -> {result["queries"]}'
+                )
+                if (ratio > 1 + threshold
+                        or result['queries'] > previous['queries']):
+                    regressions.append(line)
+                    line = self.style.ERROR(line)
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f'Замедление в {len(regressions)} замерах')
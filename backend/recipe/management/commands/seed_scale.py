@@ -0,0 +1,245 @@
+import random
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import MeFollow, MeUser
+from recipe.models import (
+    IngredientsRecipe, MeCategory, MeIngredient, MeRecipe, Select,
+    ShoppingList)
+from recipe.counters import reconcile
+from recipe.search import rebuild_index
+from recipe.versions import (
+    CATEGORIES_VERSION, RECIPE_INGREDIENTS_VERSION, RECIPES_VERSION,
+    bump_version)
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class ZipfSampler:
+    """Случайный индекс 0..n-1 с вероятностью ~ 1 / rank ** exponent
+
+    Популярность привязана к перемешанному порядку, чтобы самые
+    популярные объекты не совпадали с самыми старыми.
+    """
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cumulative = array('d')
+        total = 0.0
+        for rank in range(1, len(self.items) + 1):
+            total += rank ** -exponent
+            self.cumulative.append(total)
+        self.total = total
+        self.rng = rng
+
+    def __call__(self):
+        position = bisect_left(self.cumulative, self.rng.random() * self.total)
+        return self.items[min(position, len(self.items) - 1)]
+
+
+def batches(objects, size):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Синтетические данные большого объёма для нагрузочных замеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Среднее число ингредиентов в рецепте'
+        )
+        parser.add_argument('--favorites', type=int, default=50000)
+        parser.add_argument('--carts', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения популярности'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = f'scale{options["seed"]}'
+        ingredient_ids = list(
+            MeIngredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        if not ingredient_ids:
+            raise CommandError(
+                'Каталог ингредиентов пуст, сначала выполните load_ingredients'
+            )
+        if MeUser.objects.filter(
+                username__startswith=f'{self.prefix}_').exists():
+            raise CommandError(
+                f'Данные с --seed {options["seed"]} уже созданы'
+            )
+
+        zipf = options['zipf']
+        users = self.create_users(options['users'])
+        tags = self.tags()
+        words = ZipfSampler(
+            MeIngredient.objects.order_by('id').values_list(
+                'name', flat=True
+            ),
+            zipf, self.rng
+        )
+        recipes = self.create_recipes(
+            options['recipes'], ZipfSampler(users, zipf, self.rng), words
+        )
+        self.create_recipe_ingredients(
+            recipes, ZipfSampler(ingredient_ids, zipf, self.rng),
+            options['ingredients_per_recipe'], tags
+        )
+        popular_recipes = ZipfSampler(recipes, zipf, self.rng)
+        active_users = ZipfSampler(users, zipf, self.rng)
+        now = datetime.now(timezone.utc)
+        self.create_pairs(
+            Select, options['favorites'], active_users, popular_recipes,
+            lambda user, recipe: Select(
+                user_id=user, name_recipe_id=recipe, data=now)
+        )
+        self.create_pairs(
+            ShoppingList, options['carts'], active_users, popular_recipes,
+            lambda user, recipe: ShoppingList(
+                user_id=user, recipe_id=recipe, data=now)
+        )
+        self.create_pairs(
+            MeFollow, options['follows'], active_users,
+            ZipfSampler(users, zipf, self.rng),
+            lambda user, author: MeFollow(user_id=user, author_id=author)
+        )
+        # Счётчики избранного и корзины тоже обходят сигналы
+        fixed = reconcile()
+        self.stdout.write(f'Пересчитаны счётчики: {fixed}')
+        rebuild_index()
+        # bulk_create обходит сигналы: сдвиг версий без записи в журнал
+        # заставляет процессы собрать снимки и индексы заново
+        for key in (
+            RECIPES_VERSION, RECIPE_INGREDIENTS_VERSION, CATEGORIES_VERSION
+        ):
+            bump_version(key)
+
+    def insert(self, model, objects):
+        """Пакетная вставка с отчётом о скорости
+
+        Дубликаты по уникальным ограничениям отбрасывает сама база,
+        поэтому вставленные строки считаются по таблице.
+        """
+        before = model.objects.count()
+        generated = 0
+        start = perf_counter()
+        for batch in batches(objects, self.batch_size):
+            generated += len(batch)
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+        elapsed = perf_counter() - start
+        inserted = model.objects.count() - before
+        self.stdout.write(
+            f'{model._meta.label}: {inserted} из {generated} строк за '
+            f'{elapsed:.1f} с ({inserted / max(elapsed, 1e-9):.0f} строк/с)'
+        )
+
+    def create_users(self, count):
+        password = make_password(None)
+        self.insert(MeUser, (
+            MeUser(
+                username=f'{self.prefix}_{i}',
+                email=f'{self.prefix}_{i}@example.com',
+                password=password
+            ) for i in range(count)
+        ))
+        return array('q', MeUser.objects.filter(
+            username__startswith=f'{self.prefix}_'
+        ).order_by('id').values_list('id', flat=True))
+
+    def tags(self):
+        tags = list(
+            MeCategory.objects.order_by('id').values_list('id', flat=True)
+        )
+        if tags:
+            return tags
+        MeCategory.objects.bulk_create([
+            MeCategory(name_category=f'{self.prefix} {i}',
+                       slug=f'{self.prefix}-{i}')
+            for i in range(8)
+        ])
+        return list(
+            MeCategory.objects.order_by('id').values_list('id', flat=True)
+        )
+
+    def create_recipes(self, count, authors, words):
+        """Названия и описания из названий ингредиентов, для поиска"""
+        rng = self.rng
+        self.insert(MeRecipe, (
+            MeRecipe(
+                name_recipe=f'{self.prefix} {i} {words()} и {words()}'[:150],
+                author_id=authors(),
+                discriptions=f'{self.prefix} {i} ' + ', '.join(
+                    words() for _ in range(rng.randint(3, 12))
+                ),
+                illustration=f'{self.prefix}.png',
+                data=EPOCH + timedelta(seconds=rng.randrange(365 * 86400)),
+                time=rng.randint(5, 180)
+            ) for i in range(count)
+        ))
+        return array('q', MeRecipe.objects.filter(
+            discriptions__startswith=f'{self.prefix} '
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipe_ingredients(self, recipes, ingredients, average, tags):
+        rng = self.rng
+        spread = max(1, average // 2)
+
+        def rows():
+            for recipe in recipes:
+                count = max(1, rng.randint(average - spread, average + spread))
+                chosen = set()
+                for _ in range(count * 4):
+                    chosen.add(ingredients())
+                    if len(chosen) == count:
+                        break
+                for ingredient in chosen:
+                    yield IngredientsRecipe(
+                        name_recipe_id=recipe,
+                        name_ingredients_id=ingredient,
+                        quantity=rng.randint(1, 500)
+                    )
+
+        self.insert(IngredientsRecipe, rows())
+        Tag = MeRecipe.tags.through
+        self.insert(Tag, (
+            Tag(merecipe_id=recipe, mecategory_id=tag)
+            for recipe in recipes
+            for tag in rng.sample(tags, min(len(tags), rng.randint(1, 3)))
+        ))
+
+    def create_pairs(self, model, count, left, right, build):
+        """count пар (left, right) с перекосом популярности
+
+        Повторные пары не отслеживаются в памяти, их отбрасывает
+        уникальное ограничение таблицы.
+        """
+        def rows():
+            for _ in range(count):
+                pair = (left(), right())
+                if pair[0] != pair[1] or model is not MeFollow:
+                    yield build(*pair)
+
+        self.insert(model, rows())
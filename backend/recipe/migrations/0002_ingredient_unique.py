@@ -0,0 +1,62 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:33
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Дубликаты (name, unit_of_measure) сливаются в ингредиент с меньшим id
+
+    Строки рецептов переносятся на оставшийся ингредиент; если в рецепте
+    оказалось две строки одного ингредиента, количество складывается.
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        # Иначе отложенные проверки FK после удаления не дадут
+        # изменить таблицу в этой же транзакции
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    MeIngredient = apps.get_model('recipe', 'MeIngredient')
+    IngredientsRecipe = apps.get_model('recipe', 'IngredientsRecipe')
+    duplicates = MeIngredient.objects.values(
+        'name', 'unit_of_measure'
+    ).annotate(first=Min('id'), total=Count('id')).filter(total__gt=1)
+    kept = []
+    for row in duplicates:
+        others = MeIngredient.objects.filter(
+            name=row['name'], unit_of_measure=row['unit_of_measure']
+        ).exclude(id=row['first'])
+        IngredientsRecipe.objects.filter(
+            name_ingredients__in=others
+        ).update(name_ingredients_id=row['first'])
+        others.delete()
+        kept.append(row['first'])
+
+    repeated = IngredientsRecipe.objects.filter(
+        name_ingredients__in=kept
+    ).values('name_recipe', 'name_ingredients').annotate(
+        first=Min('id'), total=Count('id'), amount=Sum('quantity')
+    ).filter(total__gt=1)
+    for row in repeated:
+        IngredientsRecipe.objects.filter(id=row['first']).update(
+            quantity=row['amount']
+        )
+        IngredientsRecipe.objects.filter(
+            name_recipe=row['name_recipe'],
+            name_ingredients=row['name_ingredients']
+        ).exclude(id=row['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='meingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'unit_of_measure'), name='unique_ingredient'),
+        ),
+    ]
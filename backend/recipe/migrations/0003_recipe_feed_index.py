@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0002_ingredient_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='merecipe',
+            index=models.Index(fields=['-data', '-id'], name='recipe_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:35
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+INGREDIENT_PREFIX_INDEX = 'ingredient_name_upper_idx'
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    Select = apps.get_model('recipe', 'Select')
+    duplicates = Select.objects.values('user', 'name_recipe').annotate(
+        first=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for row in duplicates:
+        Select.objects.filter(
+            user=row['user'], name_recipe=row['name_recipe']
+        ).exclude(id=row['first']).delete()
+
+
+def create_prefix_index(apps, schema_editor):
+    """istartswith строится как UPPER(name) LIKE UPPER(%s), индекс под него"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX {INGREDIENT_PREFIX_INDEX} ON recipe_meingredient '
+        '(UPPER(name) varchar_pattern_ops)'
+    )
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INGREDIENT_PREFIX_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0003_recipe_feed_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_favorites, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='select',
+            constraint=models.UniqueConstraint(fields=('user', 'name_recipe'), name='unique_favorite'),
+        ),
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:43
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_INDEX = 'recipe_search_vector_idx'
+FTS_TABLE = 'recipe_merecipe_fts'
+
+PG_SEARCH_FUNCTION = '''
+CREATE OR REPLACE FUNCTION recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.name_recipe, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.discriptions, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+'''
+
+
+def create_search(apps, schema_editor):
+    """PostgreSQL: триггер и GIN-индекс, SQLite: таблица FTS5"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(PG_SEARCH_FUNCTION)
+        schema_editor.execute(
+            'CREATE TRIGGER recipe_search_vector_trigger '
+            'BEFORE INSERT OR UPDATE OF name_recipe, discriptions '
+            'ON recipe_merecipe FOR EACH ROW '
+            'EXECUTE PROCEDURE recipe_search_vector_update()'
+        )
+        # Триггер пересчитывает вектор и для уже существующих строк
+        schema_editor.execute(
+            'UPDATE recipe_merecipe SET name_recipe = name_recipe'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX {SEARCH_INDEX} ON recipe_merecipe '
+            'USING GIN (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+            'name_recipe, discriptions, tokenize = "unicode61")'
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name_recipe, discriptions) '
+            'SELECT id, name_recipe, discriptions FROM recipe_merecipe'
+        )
+
+
+def drop_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+        schema_editor.execute(
+            'DROP TRIGGER IF EXISTS recipe_search_vector_trigger '
+            'ON recipe_merecipe'
+        )
+        schema_editor.execute(
+            'DROP FUNCTION IF EXISTS recipe_search_vector_update()'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0004_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='merecipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search, drop_search),
+    ]
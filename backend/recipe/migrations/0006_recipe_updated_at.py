@@ -0,0 +1,26 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:53
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    """Для старых рецептов изменение совпадает с публикацией"""
+    MeRecipe = apps.get_model('recipe', 'MeRecipe')
+    MeRecipe.objects.update(updated_at=F('data'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0005_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='merecipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения рецепта'),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
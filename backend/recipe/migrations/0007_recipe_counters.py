@@ -0,0 +1,48 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    MeRecipe = apps.get_model('recipe', 'MeRecipe')
+    Select = apps.get_model('recipe', 'Select')
+    ShoppingList = apps.get_model('recipe', 'ShoppingList')
+
+    def total(model, field):
+        return Coalesce(Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by().values(field)
+            .annotate(total=Count('id')).values('total')
+        ), 0)
+
+    MeRecipe.objects.update(
+        favorites_count=total(Select, 'name_recipe'),
+        in_carts_count=total(ShoppingList, 'recipe')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0006_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='merecipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='merecipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='merecipe',
+            index=models.Index(fields=['-favorites_count', '-data', '-id'], name='recipe_popular_idx'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.core.validators import MinValueValidator
 from api.models import MeUser
@@ -26,6 +27,12 @@ class MeIngredient(models.Model):
     class Meta:
         verbose_name = "Ингредиент"
         verbose_name_plural = "Ингридиенты"
+        constraints = [
+            UniqueConstraint(
+                fields=['name', 'unit_of_measure'],
+                name='unique_ingredient'
+            )
+        ]
     
     def __str__(self):
         return f'{self.name}, {self.unit_of_measure}'
@@ -68,9 +75,35 @@ class MeRecipe(models.Model):
         related_name='me_recipes_with_tags',
         verbose_name='Категория')
 
+    # Сдвигается и при изменении ингредиентов и категорий
+    # (RecipeCreateUpdateSerializer.update и сигналы в signals.py),
+    # служит валидатором кэша HTTP
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения рецепта'
+    )
+
+    # Счётчики обновляются через F() в действиях favorite/shopping_cart
+    # и в сигналах удаления, расхождения правит reconcile_recipe_counters
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В списках покупок'
+    )
+
+    # Заполняется триггером PostgreSQL, GIN-индекс создан в миграции
+    search_vector = SearchVectorField(null=True, editable=False)
+
     class Meta:
         verbose_name='Рецепт'
         verbose_name_plural='Рецепты'
+        indexes = [
+            models.Index(fields=['-data', '-id'], name='recipe_feed_idx'),
+            models.Index(
+                fields=['-favorites_count', '-data', '-id'],
+                name='recipe_popular_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name_recipe
@@ -125,6 +158,12 @@ class Select(models.Model):
     class Meta:
         verbose_name='Избранное'
         verbose_name_plural='Избранное',
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'name_recipe'],
+                name='unique_favorite'
+            )
+        ]
 
     def __str__(self):
         return f'Данный рецепт {self.name_recipe} в избранном у пользователя - {self.user}'
@@ -0,0 +1,110 @@
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+POPULAR_ORDERING = ('-favorites_count', '-data', '-id')
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная пагинация ленты рецептов
+
+    Страницы выбираются по составному ключу без COUNT(*) и OFFSET:
+    курсор хранит значения всех полей сортировки, следующая страница —
+    строки строго после них в лексикографическом порядке. Курсор DRF
+    помнит только первое поле и смещение среди равных, на популярных
+    рецептах с одинаковым счётчиком он не доходит до конца ленты.
+    Порядок совпадает с составными индексами recipe_feed_idx и
+    recipe_popular_idx.
+    """
+    ordering = ('-data', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        """?ordering=popular — курсор по индексу recipe_popular_idx"""
+        if request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = None if self.cursor is None else self.cursor.position
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in ordering
+            )
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        try:
+            results = list(queryset[:self.page_size + 1])
+        except (DjangoValidationError, TypeError, ValueError):
+            # Значения в курсоре не приводятся к типам полей
+            raise NotFound(self.invalid_cursor_message)
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def after(self, ordering, position):
+        """Строки строго после position в порядке ordering
+
+        Сравнение кортежей (a, b, c) < (x, y, z) раскрывается в
+        a < x OR a = x AND b < y OR ..., чтобы база могла идти по индексу.
+        """
+        condition = Q()
+        equal = {}
+        for name, value in zip(ordering, position):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(position, list)
+                or len(position) != len(self.ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(position=position)
+
+    def link(self, instance, reverse):
+        position = [
+            getattr(instance, name.lstrip('-')) for name in self.ordering
+        ]
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=reverse, position=json.dumps([
+                value.isoformat() if hasattr(value, 'isoformat') else value
+                for value in position
+            ])
+        ))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.link(self.page[0], reverse=True)
@@ -0,0 +1,69 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос'
+    default_code = 'payload_too_large'
+
+
+class LimitedStream:
+    """Поток тела запроса, который обрывается на лимите байт
+
+    Нужен для запросов без Content-Length (chunked, ASGI): размер
+    проверяется по мере чтения, а не по заголовку.
+    """
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.consumed = 0
+
+    def _count(self, data):
+        self.consumed += len(data)
+        if self.consumed > self.limit:
+            raise PayloadTooLarge()
+        return data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            # Читаем не больше лимита плюс байт, чтобы заметить превышение
+            size = self.limit - self.consumed + 1
+        return self._count(self.stream.read(size))
+
+    def readline(self, size=-1):
+        if size is None or size < 0:
+            size = self.limit - self.consumed + 1
+        return self._count(self.stream.readline(size))
+
+
+class UploadLimitMixin:
+    """Отказ по Content-Length до чтения тела и по объёму при чтении"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        limit = settings.RECIPE_UPLOAD_MAX_BYTES
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length > limit:
+            raise PayloadTooLarge()
+        if stream is not None:
+            stream = LimitedStream(stream, limit)
+        return super().parse(stream, media_type, parser_context)
+
+
+class LimitedJSONParser(UploadLimitMixin, JSONParser):
+    pass
+
+
+class LimitedFormParser(UploadLimitMixin, FormParser):
+    pass
+
+
+class LimitedMultiPartParser(UploadLimitMixin, MultiPartParser):
+    pass
@@ -0,0 +1,202 @@
+"""
+Уменьшенные копии фото рецептов в JPEG и WebP.
+
+Копии строятся в пуле процессов, чтобы не занимать потоки запросов.
+Если копии ещё нет, отдаётся оригинал, а сборка ставится в очередь.
+Ответ с таким временным адресом не кэшируется и не получает ETag
+(см. track_pending), поэтому после сборки копий ничего не нужно
+сбрасывать.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from io import BytesIO
+from threading import Lock
+from time import monotonic
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumb': (320, 320),
+    'card': (640, 640),
+    'detail': (1280, 1280),
+}
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+}
+# Pillow без libwebp: вместо WebP отдаётся JPEG
+if not features.check('webp'):
+    del FORMATS['webp']
+
+READY_LIMIT = 100_000
+# Через сколько секунд снова проверять хранилище на отсутствующую копию
+RECHECK_AFTER = 30
+# Через сколько секунд повторять сборку, которая завершилась ошибкой
+RETRY_AFTER = 10 * 60
+
+_lock = Lock()
+_executor = None
+_pending = set()
+_ready = set()
+_missing = {}
+_failed = {}
+
+pending_renditions = ContextVar('pending_renditions', default=None)
+
+
+class PendingRenditions:
+    def __init__(self):
+        self.pending = False
+
+
+@contextmanager
+def track_pending():
+    """Отмечает, отдал ли ответ адрес оригинала вместо копии в сборке
+
+    Вложенные блоки передают отметку наружу.
+    """
+    outer = pending_renditions.get()
+    state = PendingRenditions()
+    token = pending_renditions.set(state)
+    try:
+        yield state
+    finally:
+        pending_renditions.reset(token)
+        if outer is not None and state.pending:
+            outer.pending = True
+
+
+def _mark_pending():
+    state = pending_renditions.get()
+    if state is not None:
+        state.pending = True
+
+
+def _remember(store, key, value):
+    if len(store) >= READY_LIMIT:
+        store.clear()
+    if isinstance(store, set):
+        store.add(key)
+    else:
+        store[key] = value
+
+
+def rendition_name(name, rendition, image_format):
+    stem = os.path.splitext(name)[0]
+    extension = FORMATS[image_format][0]
+    return f'renditions/{stem}_{rendition}.{extension}'
+
+
+def build_renditions(name):
+    """Сборка всех копий одного изображения, выполняется в пуле"""
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    for rendition, size in RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        for image_format, (_, options) in FORMATS.items():
+            converted = resized
+            if image_format == 'jpeg' and resized.mode != 'RGB':
+                converted = resized.convert('RGB')
+            buffer = BytesIO()
+            converted.save(buffer, image_format, **options)
+            target = rendition_name(name, rendition, image_format)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+    return name
+
+
+def _setup_worker():
+    django.setup()
+
+
+def _targets(name):
+    return [
+        rendition_name(name, rendition, image_format)
+        for rendition in RENDITIONS for image_format in FORMATS
+    ]
+
+
+def _done(name, future):
+    """Колбэк пула: только память процесса, без обращений к базе"""
+    error = future.exception()
+    with _lock:
+        _pending.discard(name)
+        if error is None:
+            for target in _targets(name):
+                _missing.pop(target, None)
+                _remember(_ready, target, None)
+        else:
+            # Пока не истёк RETRY_AFTER, сборка не повторяется
+            _remember(_failed, name, monotonic())
+    if error is not None:
+        logger.error('Не удалось собрать копии %s', name, exc_info=error)
+
+
+def _failed_recently(name):
+    failed_at = _failed.get(name)
+    return failed_at is not None and monotonic() - failed_at < RETRY_AFTER
+
+
+def schedule(name):
+    """Поставить сборку копий в очередь пула, повторы отбрасываются"""
+    global _executor
+    with _lock:
+        if name in _pending or _failed_recently(name):
+            return
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.RENDITION_WORKERS,
+                initializer=_setup_worker
+            )
+        _pending.add(name)
+    _executor.submit(build_renditions, name).add_done_callback(
+        lambda future: _done(name, future)
+    )
+
+
+def ensure_renditions(name):
+    if not default_storage.exists(rendition_name(name, 'detail', 'jpeg')):
+        schedule(name)
+
+
+def rendition_url(image, rendition, image_format='jpeg'):
+    """Адрес копии, а пока её нет — адрес оригинала
+
+    Наличие копии запоминается в памяти процесса: хранилище проверяется
+    не чаще раза в RECHECK_AFTER секунд на копию, а не на каждый ответ.
+    """
+    if image_format not in FORMATS:
+        image_format = 'jpeg'
+    name = image.name
+    target = rendition_name(name, rendition, image_format)
+    if target in _ready:
+        return default_storage.url(target)
+    if _failed_recently(name):
+        # Копий не будет до повтора, ответ можно кэшировать
+        return image.url
+    checked_at = _missing.get(target)
+    if checked_at is None or monotonic() - checked_at >= RECHECK_AFTER:
+        if default_storage.exists(target):
+            with _lock:
+                _missing.pop(target, None)
+                _remember(_ready, target, None)
+            return default_storage.url(target)
+        with _lock:
+            _remember(_missing, target, monotonic())
+        schedule(name)
+    if not _failed_recently(name):
+        _mark_pending()
+    return image.url
@@ -0,0 +1,89 @@
+"""
+Полнотекстовый поиск рецептов по названию и описанию.
+
+На PostgreSQL поиск идёт по столбцу search_vector (конфигурация russian),
+который поддерживает триггер, с GIN-индексом. На SQLite используется
+таблица FTS5, её обновляют сигналы. На остальных базах — icontains.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'recipe_merecipe_fts'
+
+
+def fts_query(text):
+    """Запрос FTS5 из текста пользователя: все слова, последнее — префикс"""
+    words = ['"{}"'.format(word.replace('"', '""')) for word in text.split()]
+    words[-1] += '*'
+    return ' '.join(words)
+
+
+def search_recipes(queryset, text):
+    text = text.strip()
+    if not text:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        query = SearchQuery(text, config='russian', search_type='websearch')
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        )
+    elif vendor == 'sqlite':
+        # Отбор по совпадениям FTS5, ранг bm25 считается только для
+        # отобранных строк поиском по rowid
+        match = fts_query(text)
+        queryset = queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [match]
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 1.0, 0.4) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND {FTS_TABLE}.rowid = recipe_merecipe.id',
+            [match], output_field=FloatField()
+        ))
+    else:
+        queryset = queryset.filter(
+            Q(name_recipe__icontains=text) | Q(discriptions__icontains=text)
+        ).annotate(search_rank=Value(0))
+    return queryset.order_by('-search_rank', '-data', '-id')
+
+
+def index_recipe(recipe, using):
+    """Обновление строки FTS5 на SQLite, на PostgreSQL работает триггер"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe.id]
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name_recipe, discriptions) '
+            'VALUES (%s, %s, %s)',
+            [recipe.id, recipe.name_recipe, recipe.discriptions]
+        )
+
+
+def unindex_recipe(recipe_id, using):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+        )
+
+
+def rebuild_index(using='default'):
+    """Полная перестройка FTS5 после bulk_create, который обходит сигналы"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name_recipe, discriptions) '
+            'SELECT id, name_recipe, discriptions FROM recipe_merecipe'
+        )
@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from .models import (
     MeIngredient,
@@ -6,7 +8,11 @@ from .models import (
     IngredientsRecipe,
     ShoppingList, Select)
 
-from api.serializers import MeUserSerializer
+from api.serializers import FollowStateListSerializer, MeUserSerializer
+from foodgram.metrics import TimedSerializerMixin
+from .fields import InlineImageField, RenditionField
+from .index import recipe_ingredients_changed
+from .renditions import rendition_url
 
 class MeIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для ингедиентов """
@@ -34,6 +40,7 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и обновления рецептов"""
     ingredients = RecipeIngredientCreateSerializer(many=True)
+    illustration = InlineImageField()
     tags = serializers.PrimaryKeyRelatedField(
         queryset=MeCategory.objects.all(),
         many=True
@@ -42,7 +49,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = MeRecipe
         fields = [
-            'name_recipe', 'illustration', 'discriptions', 'name_ingredients',
+            'name_recipe', 'illustration', 'discriptions', 'ingredients',
             'tags', 'time'
         ]
     
@@ -64,39 +71,89 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     def create_ingredients(self, recipe, ingredients):
         IngredientsRecipe.objects.bulk_create([
             IngredientsRecipe(
-                recipe=recipe,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount']
+                name_recipe=recipe,
+                name_ingredients=ingredient['id'],
+                quantity=ingredient['quantity']
             ) for ingredient in ingredients
         ])
+        # bulk_create не отправляет сигналы, индекс уведомляется явно
+        recipe_ingredients_changed(recipe.id)
     
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = MeRecipe.objects.create(
-            author=self.context['request'].user,
-            **validated_data
-        )
-        recipe.tags.set(tags)
-        self.create_ingredients(recipe, ingredients)
+        validated_data.setdefault('author', self.context['request'].user)
+        validated_data.setdefault('data', timezone.now())
+        with transaction.atomic():
+            recipe = MeRecipe.objects.create(**validated_data)
+            recipe.tags.set(tags)
+            self.create_ingredients(recipe, ingredients)
         return recipe
+
+    def update_tags(self, recipe, tags):
+        """Только недостающие и лишние связи, без clear()
+
+        Возвращает True, если что-то изменилось.
+        """
+        current = set(recipe.tags.values_list('id', flat=True))
+        wanted = {tag.id for tag in tags}
+        if current - wanted:
+            recipe.tags.remove(*(current - wanted))
+        if wanted - current:
+            recipe.tags.add(*(wanted - current))
+        return current != wanted
+
+    def update_ingredients(self, recipe, ingredients):
+        """Разница с текущим составом: вставка, обновление, удаление
+
+        Возвращает True, если что-то изменилось.
+        """
+        current = {
+            row.name_ingredients_id: row
+            for row in recipe.recipe_ingredients.all()
+        }
+        wanted = {item['id'].id: item for item in ingredients}
+        removed = [
+            row.id for ingredient, row in current.items()
+            if ingredient not in wanted
+        ]
+        added = [
+            item for ingredient, item in wanted.items()
+            if ingredient not in current
+        ]
+        changed = []
+        for ingredient, item in wanted.items():
+            row = current.get(ingredient)
+            if row is not None and row.quantity != item['quantity']:
+                row.quantity = item['quantity']
+                changed.append(row)
+        if removed:
+            IngredientsRecipe.objects.filter(id__in=removed).delete()
+        if changed:
+            IngredientsRecipe.objects.bulk_update(changed, ['quantity'])
+        if added:
+            self.create_ingredients(recipe, added)
+        return bool(removed or changed or added)
     
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        
-        instance.name = validated_data.get('name', instance.name)
-        instance.illustration = validated_data.get('image', instance.illustration)
-        instance.text = validated_data.get('text', instance.text)
-        instance.time = validated_data.get('time', instance.time)
-        
-        instance.tags.clear()
-        instance.tags.set(tags)
-        
-        instance.recipe_ingredients.all().delete()
-        self.create_ingredients(instance, ingredients)
-        
-        instance.save()
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        fields = [
+            name for name, value in validated_data.items()
+            if getattr(instance, name) != value
+        ]
+        with transaction.atomic():
+            changed = bool(fields)
+            if tags is not None:
+                changed |= self.update_tags(instance, tags)
+            if ingredients is not None:
+                changed |= self.update_ingredients(instance, ingredients)
+            if changed:
+                # Один UPDATE строки рецепта: поля и updated_at,
+                # post_save сдвигает версию рецептов
+                for name in fields:
+                    setattr(instance, name, validated_data[name])
+                instance.save(update_fields=fields + ['updated_at'])
         return instance
     
     def to_representation(self, instance):
@@ -107,8 +164,9 @@ class MeCategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = MeCategory
         fields = '__all__'
-    
-class RecipeReadSerializer(serializers.ModelSerializer):
+
+
+class RecipeReadSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для чтения рецептов"""
     author = MeUserSerializer(read_only=True)
     tags = MeCategorySerializer(many=True, read_only=True)
@@ -119,25 +177,38 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    illustration = RenditionField()
+    illustration_webp = RenditionField(
+        source='illustration', image_format='webp'
+    )
+    # Подписки на авторов всей страницы — одним запросом
+    follow_author_field = 'author_id'
     
     class Meta:
         model = MeRecipe
         fields = [
-            'id', 'author', 'name', 'image', 'text', 
-            'ingredients', 'tags', 'cooking_time',
-            'pub_date', 'is_favorited', 'is_in_shopping_cart'
+            'id', 'author', 'name_recipe', 'illustration',
+            'illustration_webp', 'discriptions',
+            'ingredients', 'tags', 'time',
+            'data', 'is_favorited', 'is_in_shopping_cart'
         ]
+        list_serializer_class = FollowStateListSerializer
     
     def get_is_favorited(self, obj):
+        # Для списков флаг уже посчитан аннотацией в MeRecipeViewSet
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Select.objects.filter(
                 user=request.user,
-                recipe=obj
+                name_recipe=obj
             ).exists()
         return False
     
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return ShoppingList.objects.filter(
@@ -147,6 +218,20 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         return False
 
 
+def short_recipe(recipe):
+    """Краткое представление рецепта с миниатюрами фото"""
+    image = recipe.illustration
+    return {
+        'id': recipe.id,
+        'name_recipe': recipe.name_recipe,
+        'illustration': rendition_url(image, 'thumb') if image else None,
+        'illustration_webp': (
+            rendition_url(image, 'thumb', 'webp') if image else None
+        ),
+        'time': recipe.time
+    }
+
+
 class ShoppingListSerializer(serializers.ModelSerializer):
     """Сериализатор покупок """
     class Meta:
@@ -154,12 +239,7 @@ class ShoppingListSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'data']
 
     def to_representation(self, instance):
-        return {
-            'id': instance.recipe.id,
-            'name_recipe': instance.recipe.name_recipe,
-            'illustration': instance.recipe.illustration.url,
-            'time': instance.recipe.time
-        }
+        return short_recipe(instance.recipe)
     
 class FavoriteSerializer(serializers.ModelSerializer):
     """Сериализатор для избранного"""
@@ -168,47 +248,4 @@ class FavoriteSerializer(serializers.ModelSerializer):
         fields = ['user', 'name_recipe']
     
     def to_representation(self, instance):
-        return {
-            'id': instance.recipe.id,
-            'name_recipe': instance.recipe.name_recipe,
-            'illustration': instance.recipe.illustration.url,
-            'time': instance.recipe.time
-        }
-
-class RecipeReadSerializer(serializers.ModelSerializer):
-    """Сериализатор для чтения рецептов"""
-    author = MeUserSerializer(read_only=True)
-    tags = MeCategorySerializer(many=True, read_only=True)
-    ingredients = IngredientsRecipeSerializer(
-        many=True,
-        source='recipe_ingredients',
-        read_only=True
-    )
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
-    
-    class Meta:
-        model = MeRecipe
-        fields = [
-            'id', 'author', 'name_recipe', 'illustration', 'discriptions', 
-            'name_ingredients', 'tags', 'time', 'date']
-    
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Select.objects.filter(
-                user=request.user,
-                recipe=obj
-            ).exists()
-        return False
-    
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return ShoppingList.objects.filter(
-                user=request.user,
-                recipe=obj
-            ).exists()
-        return False
-
-
+        return short_recipe(instance.name_recipe)
@@ -0,0 +1,131 @@
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.models import MeFollow
+
+from .models import (
+    IngredientsRecipe, MeCategory, MeIngredient, MeRecipe, Select,
+    ShoppingList)
+from .counters import decrement, increment
+from .index import recipe_ingredients_changed
+from .renditions import ensure_renditions
+from .search import index_recipe, unindex_recipe
+from .versions import (
+    AUTHORS_VERSION, CATEGORIES_VERSION, INGREDIENTS_VERSION, RECIPES_VERSION,
+    bump_version_on_commit, user_version_key)
+
+
+@receiver(post_save, sender=MeIngredient)
+@receiver(post_delete, sender=MeIngredient)
+def ingredients_changed(**kwargs):
+    bump_version_on_commit(INGREDIENTS_VERSION)
+
+
+@receiver(post_save, sender=MeRecipe)
+@receiver(post_delete, sender=MeRecipe)
+@receiver(post_save, sender=IngredientsRecipe)
+@receiver(post_delete, sender=IngredientsRecipe)
+@receiver(post_save, sender=MeCategory)
+@receiver(post_delete, sender=MeCategory)
+def recipes_changed(**kwargs):
+    bump_version_on_commit(RECIPES_VERSION)
+
+
+@receiver(post_save, sender=MeCategory)
+@receiver(post_delete, sender=MeCategory)
+def categories_changed(**kwargs):
+    bump_version_on_commit(CATEGORIES_VERSION)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def author_changed(created, update_fields=None, **kwargs):
+    """Имя и профиль автора входят в ответы с рецептами"""
+    if created or update_fields is not None and (
+        set(update_fields) <= {'last_login'}
+    ):
+        return
+    bump_version_on_commit(AUTHORS_VERSION)
+
+
+@receiver(post_save, sender=Select)
+@receiver(post_delete, sender=Select)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_save, sender=MeFollow)
+@receiver(post_delete, sender=MeFollow)
+def user_state_changed(instance, **kwargs):
+    bump_version_on_commit(user_version_key(instance.user_id))
+
+
+def touch_recipes(recipe_ids):
+    """Сдвиг updated_at — валидатора кэша HTTP — без post_save"""
+    MeRecipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(m2m_changed, sender=MeRecipe.tags.through)
+def recipe_tags_changed(action, instance, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # После очистки рецепты категории уже не найти
+        touch_recipes(
+            instance.me_recipes_with_tags.values_list('id', flat=True)
+        )
+    if action.startswith('post_'):
+        bump_version_on_commit(RECIPES_VERSION)
+        # add() и remove() без новых связей приходят с пустым pk_set
+        if reverse and pk_set:
+            touch_recipes(pk_set)
+        elif not reverse and (pk_set or action == 'post_clear'):
+            touch_recipes([instance.pk])
+
+
+@receiver(post_save, sender=MeRecipe)
+def recipe_illustration_saved(instance, **kwargs):
+    if instance.illustration:
+        name = instance.illustration.name
+        transaction.on_commit(lambda: ensure_renditions(name))
+
+
+@receiver(post_save, sender=MeRecipe)
+def recipe_search_saved(instance, using, update_fields, **kwargs):
+    if update_fields and not {'name_recipe', 'discriptions'} & update_fields:
+        return
+    index_recipe(instance, using)
+
+
+@receiver(post_delete, sender=MeRecipe)
+def recipe_search_deleted(instance, using, **kwargs):
+    unindex_recipe(instance.id, using)
+
+
+@receiver(post_save, sender=IngredientsRecipe)
+@receiver(post_delete, sender=IngredientsRecipe)
+def recipe_ingredient_changed(instance, **kwargs):
+    recipe_ingredients_changed(instance.name_recipe_id)
+    touch_recipes([instance.name_recipe_id])
+
+
+@receiver(post_save, sender=Select)
+def favorite_saved(instance, created, **kwargs):
+    if created:
+        increment(instance.name_recipe_id, 'favorites_count')
+
+
+@receiver(post_delete, sender=Select)
+def favorite_deleted(instance, **kwargs):
+    decrement(instance.name_recipe_id, 'favorites_count')
+
+
+@receiver(post_save, sender=ShoppingList)
+def cart_item_saved(instance, created, **kwargs):
+    if created:
+        increment(instance.recipe_id, 'in_carts_count')
+
+
+@receiver(post_delete, sender=ShoppingList)
+def cart_item_deleted(instance, **kwargs):
+    decrement(instance.recipe_id, 'in_carts_count')
@@ -1,3 +1,1216 @@
-from django.test import TestCase
+import base64
+import json
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from threading import BoundedSemaphore, Event
+from time import sleep
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.http import StreamingHttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from psycopg2 import Error, OperationalError
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS)
+from rest_framework.pagination import PageNumberPagination
+
+from api.models import MeFollow, MeUser
+from foodgram.db import pool
+from foodgram.routers import STICKY_COOKIE, ReplicaRouter
+
+from . import async_views, images, renditions
+from .management.commands._bench import seed
+from .models import (
+    IngredientsRecipe, MeCategory, MeIngredient, MeRecipe, Select,
+    ShoppingList)
+from .cache import cache_stats
+from .index import RecipeIngredientIndex
+from .parsers import LimitedJSONParser, PayloadTooLarge
+from .search import search_recipes
+from .serializers import RecipeCreateUpdateSerializer
+from .utils import generate_shopping_list
+from .versions import (
+    RECIPE_INGREDIENTS_VERSION, RECIPES_VERSION, bump_version, get_version)
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class FakePool:
+    """Пул копий без процессов: задания ждут, пока их не завершит тест"""
+
+    def __init__(self, *args, **kwargs):
+        self.jobs = []
+
+    def submit(self, function, *args):
+        future = Future()
+        self.jobs.append((args, future))
+        return future
+
+
+def reset_renditions():
+    renditions._executor = None
+    for store in (renditions._pending, renditions._ready,
+                  renditions._missing, renditions._failed):
+        store.clear()
+
+
+# Ответы с фото ставят сборку копий в очередь, процессы для этого
+# в тестах не нужны
+renditions_pool = mock.patch.object(
+    renditions, 'ProcessPoolExecutor', FakePool
+)
+
+
+def setUpModule():
+    reset_renditions()
+    renditions_pool.start()
+
+
+def tearDownModule():
+    renditions_pool.stop()
+    reset_renditions()
+
+
+class RecipeUpdateTest(TestCase):
+    """Обновление рецепта пишет в базу только изменения"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MeUser.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        cls.tags = [
+            MeCategory.objects.create(
+                name_category=f'Категория {i}', slug=f'tag-{i}',
+                color=f'#00000{i}'
+            ) for i in range(3)
+        ]
+        cls.ingredients = [
+            MeIngredient.objects.create(
+                name=f'Продукт {i}', unit_of_measure='г'
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.recipe = MeRecipe.objects.create(
+            name_recipe='Суп', author=self.user, discriptions='Описание',
+            illustration='recipes/soup.png', data=timezone.now(), time=30
+        )
+        self.recipe.tags.set(self.tags[:2])
+        IngredientsRecipe.objects.bulk_create([
+            IngredientsRecipe(
+                name_recipe=self.recipe, name_ingredients=ingredient,
+                quantity=100
+            ) for ingredient in self.ingredients[:3]
+        ])
+
+    def payload(self, **changes):
+        data = {
+            'name_recipe': 'Суп',
+            'discriptions': 'Описание',
+            'time': 30,
+            'tags': [tag.id for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'quantity': 100}
+                for ingredient in self.ingredients[:3]
+            ],
+        }
+        data.update(changes)
+        return data
+
+    def writes(self, data):
+        serializer = RecipeCreateUpdateSerializer(
+            self.recipe, data=data, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as queries:
+            serializer.save()
+        return [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].lstrip().upper().startswith(WRITES)
+        ]
+
+    def state(self):
+        return (
+            sorted(self.recipe.tags.values_list('id', flat=True)),
+            sorted(self.recipe.recipe_ingredients.values_list(
+                'name_ingredients_id', 'quantity'
+            ))
+        )
+
+    def test_unchanged(self):
+        self.assertEqual(self.writes(self.payload()), [])
+
+    def test_time(self):
+        updated_at = self.recipe.updated_at
+        self.assertEqual(len(self.writes(self.payload(time=45))), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.time, 45)
+        self.assertGreater(self.recipe.updated_at, updated_at)
+
+    def test_quantity(self):
+        ingredients = self.payload()['ingredients']
+        ingredients[0]['quantity'] = 250
+        self.assertEqual(
+            len(self.writes(self.payload(ingredients=ingredients))), 2
+        )
+        self.assertIn((self.ingredients[0].id, 250), self.state()[1])
+
+    def test_add_and_remove_ingredient(self):
+        ingredients = self.payload()['ingredients'][1:] + [
+            {'id': self.ingredients[4].id, 'quantity': 5}
+        ]
+        # DELETE, INSERT, UPDATE рецепта и сдвиг updated_at сигналом
+        # удаления строки
+        self.assertEqual(
+            len(self.writes(self.payload(ingredients=ingredients))), 4
+        )
+        self.assertEqual(self.state()[1], sorted([
+            (self.ingredients[1].id, 100), (self.ingredients[2].id, 100),
+            (self.ingredients[4].id, 5)
+        ]))
+
+    def test_replace_tag(self):
+        tags = [self.tags[0].id, self.tags[2].id]
+        # DELETE, INSERT и UPDATE рецепта, плюс сдвиг updated_at
+        # сигналом m2m_changed на remove() и add()
+        self.assertEqual(len(self.writes(self.payload(tags=tags))), 5)
+        self.assertEqual(self.state()[0], sorted(tags))
+
+    def test_updated_at_outside_serializer(self):
+        """Правки мимо сериализатора (админка, shell) тоже сдвигают
+        updated_at"""
+        changes = (
+            lambda: self.recipe.tags.add(self.tags[2]),
+            lambda: self.tags[1].me_recipes_with_tags.remove(self.recipe),
+            lambda: self.tags[0].me_recipes_with_tags.clear(),
+            lambda: IngredientsRecipe.objects.create(
+                name_recipe=self.recipe,
+                name_ingredients=self.ingredients[4], quantity=1
+            ),
+            lambda: IngredientsRecipe.objects.filter(
+                name_recipe=self.recipe
+            ).first().delete(),
+        )
+        for change in changes:
+            updated_at = MeRecipe.objects.get(pk=self.recipe.pk).updated_at
+            change()
+            self.assertGreater(
+                MeRecipe.objects.get(pk=self.recipe.pk).updated_at,
+                updated_at
+            )
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка не зависит от размера страницы"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = seed(20)
+        self.client.force_login(self.user)
+
+    def list_queries(self, page_size):
+        with mock.patch.object(PageNumberPagination, 'page_size', page_size), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/recipe/recipes/')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(len(results), page_size)
+        # Все рецепты seed в избранном и корзине, авторы — с подписками
+        self.assertTrue(all(
+            item['is_favorited'] and item['is_in_shopping_cart']
+            for item in results
+        ))
+        return len(queries)
+
+    def test_fixed_query_count(self):
+        # Сессия и пользователь, COUNT, рецепты с авторами и флагами,
+        # теги, состав, ингредиенты, подписки на авторов страницы
+        self.assertEqual(self.list_queries(2), 8)
+        self.assertEqual(self.list_queries(10), 8)
+
+
+class ShoppingListStreamTest(TestCase):
+    """Первая строка списка покупок приходит до конца выгрузки"""
+
+    def test_first_row(self):
+        user = seed(50)
+        rows = len(list(generate_shopping_list(user)))
+        fetched = []
+
+        def counted(user):
+            for row in generate_shopping_list(user):
+                fetched.append(row)
+                yield row
+
+        self.client.force_login(user)
+        for format, header in (('txt', 'Список покупок'),
+                               ('csv', 'Ингредиент')):
+            fetched.clear()
+            with mock.patch('recipe.utils.generate_shopping_list', counted), \
+                    CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    '/recipe/recipes/download_shopping_cart/',
+                    {'format': format}
+                )
+                self.assertIsInstance(response, StreamingHttpResponse)
+                # Строки читаются из базы по ходу отдачи, не в представлении
+                self.assertEqual(fetched, [])
+                chunks = iter(response.streaming_content)
+                self.assertIn(header, next(chunks).decode())
+                before_rows = len(queries)
+                first_row = next(chunks).decode()
+                # Первая строка ушла, когда выбрана только она
+                self.assertEqual(len(fetched), 1)
+                rest = sum(1 for _ in chunks)
+            self.assertEqual(len(queries) - before_rows, 1)
+            self.assertIn('bench', first_row)
+            self.assertEqual(rest + 1, rows)
+            self.assertEqual(len(fetched), rows)
+
+    async def test_asgi(self):
+        """Под ASGI тело отдаётся в цикле событий, где ORM недоступен"""
+        user = await sync_to_async(seed)(5)
+        rows = await sync_to_async(
+            lambda: len(list(generate_shopping_list(user)))
+        )()
+        await sync_to_async(self.async_client.force_login)(user)
+        for format in ('txt', 'csv'):
+            response = await self.async_client.get(
+                '/recipe/recipes/download_shopping_cart/', {'format': format}
+            )
+            self.assertEqual(response.status_code, 200)
+            lines = b''.join(response.streaming_content).decode().splitlines()
+            self.assertEqual(
+                len([line for line in lines if 'bench' in line]), rows
+            )
+
+
+class IngredientAutocompleteTest(TestCase):
+    """Автодополнение ингредиентов из индекса в памяти"""
+
+    url = '/recipe/ingredients/'
+
+    @classmethod
+    def setUpTestData(cls):
+        MeIngredient.objects.bulk_create([
+            MeIngredient(name=name, unit_of_measure='г')
+            for name in ('Соль', 'сахарная пудра', 'Мука', 'Сахар')
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data]
+
+    def test_prefix(self):
+        self.assertEqual(
+            self.names(self.client.get(self.url, {'name': 'САХ'})),
+            ['Сахар', 'сахарная пудра']
+        )
+        # Индекс собран, база больше не нужна
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.names(self.client.get(self.url, {'name': 'с'})),
+                ['Сахар', 'сахарная пудра', 'Соль']
+            )
+
+    def test_limit(self):
+        self.assertEqual(
+            self.names(self.client.get(self.url, {'name': 'с', 'limit': 1})),
+            ['Сахар']
+        )
+        for limit in ('-1', 'abc'):
+            response = self.client.get(self.url, {'limit': limit})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('limit', response.data)
+
+    def test_not_modified(self):
+        params = {'name': 'м'}
+        etag = self.client.get(self.url, params)['ETag']
+        self.assertEqual(self.client.get(
+            self.url, params, HTTP_IF_NONE_MATCH=etag
+        ).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            MeIngredient.objects.create(name='Масло', unit_of_measure='г')
+        response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(self.names(response), ['Масло', 'Мука'])
+
+
+class LoadIngredientsTest(TestCase):
+    """Повторная загрузка каталога не создаёт дубликатов"""
+
+    def load(self, directory, name, content):
+        path = os.path.join(directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'load_ingredients', path, batch_size=2, stdout=stdout,
+            stderr=stderr
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_idempotent(self):
+        rows = 'Соль,г\nСахар,г\nСоль,г\n,г\nМука,кг\n'
+        items = json.dumps([
+            {'name': 'Мука', 'measurement_unit': 'кг'},
+            {'name': 'Мука', 'measurement_unit': 'г'},
+            {'name': 'Перец'},
+        ])
+        with TemporaryDirectory() as directory:
+            output, warnings = self.load(directory, 'ingredients.csv', rows)
+            self.assertIn('Прочитано 4, добавлено 3', output)
+            self.assertIn('Пропущено 1 неполных записей: 4', warnings)
+            output, _ = self.load(directory, 'ingredients.csv', rows)
+            self.assertIn('добавлено 0', output)
+            output, warnings = self.load(directory, 'more.json', items)
+            self.assertIn('Прочитано 2, добавлено 1', output)
+            self.assertIn('Пропущено 1 неполных записей: 3', warnings)
+        self.assertEqual(sorted(MeIngredient.objects.values_list(
+            'name', 'unit_of_measure'
+        )), [
+            ('Мука', 'г'), ('Мука', 'кг'), ('Сахар', 'г'), ('Соль', 'г')
+        ])
+
+
+class RecipeIngredientIndexTest(TestCase):
+    """Подбор рецептов по продуктам и обновление индекса"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = MeUser.objects.create_user(
+            username='cook', email='cook@example.com', password='pass'
+        )
+        MeIngredient.objects.bulk_create([
+            MeIngredient(name=f'Продукт {i}', unit_of_measure='г')
+            for i in range(4)
+        ])
+        cls.ingredients = list(MeIngredient.objects.order_by('id'))
+        cls.recipes = []
+        for name, used in (('Два', [0, 1]), ('Три', [0, 1, 2]),
+                           ('Один', [3])):
+            recipe = MeRecipe.objects.create(
+                name_recipe=name, author=user, discriptions='Описание',
+                illustration='', data=timezone.now(), time=10
+            )
+            IngredientsRecipe.objects.bulk_create([
+                IngredientsRecipe(
+                    name_recipe=recipe, quantity=1,
+                    name_ingredients=cls.ingredients[i]
+                ) for i in used
+            ])
+            cls.recipes.append(recipe.id)
+
+    def setUp(self):
+        cache.clear()
+        self.index = RecipeIngredientIndex()
+
+    def ids(self, *positions):
+        return [self.ingredients[i].id for i in positions]
+
+    def test_search(self):
+        two, three, one = self.recipes
+        self.assertEqual(
+            self.index.search(self.ids(0, 1)), [(two, 2, 2), (three, 2, 3)]
+        )
+        self.assertEqual(self.index.search(self.ids(0), missing=1), [
+            (two, 1, 2)
+        ])
+        self.assertEqual(self.index.search(self.ids(3, 3)), [(one, 1, 1)])
+
+    def test_apply_logged_change(self):
+        two, three, _ = self.recipes
+        self.index.search(self.ids(0))
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientsRecipe.objects.filter(
+                name_recipe_id=three, name_ingredients=self.ingredients[2]
+            ).delete()
+        with mock.patch.object(self.index, 'build') as build:
+            self.assertEqual(self.index.search(self.ids(0, 1)), [
+                (three, 2, 2), (two, 2, 2)
+            ])
+        build.assert_not_called()
+
+    def test_apply_swaps_copies(self):
+        two, three, _ = self.recipes
+        self.index.search(self.ids(0))
+        postings, totals = self.index._state
+        # Массив счётчиков — по элементу на id рецепта, не по байту
+        self.assertEqual(len(totals), max(self.recipes) + 1)
+        snapshot = {key: list(value) for key, value in postings.items()}
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientsRecipe.objects.filter(name_recipe_id=two).delete()
+        self.index.search(self.ids(0))
+        # Поиск, начатый до apply, дочитывает прежнюю пару без изменений
+        self.assertEqual(
+            {key: list(value) for key, value in postings.items()}, snapshot
+        )
+        self.assertEqual(totals[two], 2)
+        self.assertIsNot(self.index._state[0], postings)
+        self.assertEqual(self.index._state[1][two], 0)
+
+    def test_bulk_change_rebuilds(self):
+        _, three, _ = self.recipes
+        self.index.search(self.ids(0))
+        IngredientsRecipe.objects.create(
+            name_recipe_id=three, name_ingredients=self.ingredients[3],
+            quantity=1
+        )
+        bump_version(RECIPE_INGREDIENTS_VERSION)
+        self.assertIn((three, 1, 4), self.index.search(self.ids(3)))
+
+
+class SearchTest(TestCase):
+    """Поиск по названию и описанию: отбор и ранжирование"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MeUser.objects.create_user(
+            username='searcher', email='searcher@example.com', password='pass'
+        )
+        cls.other = MeUser.objects.create_user(
+            username='other', email='other@example.com', password='pass'
+        )
+
+        def create(name, description, author=cls.user):
+            return MeRecipe.objects.create(
+                name_recipe=name, author=author, discriptions=description,
+                illustration='', data=timezone.now(), time=10
+            )
+
+        cls.in_name = create('Тыквенный суп', 'Запечь и протереть')
+        cls.in_description = create('Каша', 'Пшено и тыквенный сок')
+        cls.by_other = create('Тыквенный пирог', 'Тесто', cls.other)
+        create('Плов', 'Рис и морковь')
+
+    def search(self, text, queryset=None):
+        queryset = MeRecipe.objects.all() if queryset is None else queryset
+        return list(search_recipes(queryset, text))
+
+    def test_name_ranked_above_description(self):
+        found = self.search('тыквенный', MeRecipe.objects.filter(
+            author=self.user
+        ))
+        self.assertEqual(found, [self.in_name, self.in_description])
+
+    def test_prefix_and_all_words(self):
+        self.assertEqual(len(self.search('тыкв')), 3)
+        self.assertEqual(self.search('тыквенный сок'), [self.in_description])
+        self.assertEqual(self.search('борщ'), [])
+
+    def test_index_follows_updates(self):
+        self.in_description.discriptions = 'Пшено и молоко'
+        self.in_description.save()
+        self.assertNotIn(self.in_description, self.search('тыквенный'))
+        self.by_other.delete()
+        self.assertEqual(self.search('пирог'), [])
+
+    def test_list_filter(self):
+        response = self.client.get(
+            '/recipe/recipes/',
+            {'search': 'тыквенный', 'author': self.other.id}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.by_other.id]
+        )
+
+
+class CountersTest(TestCase):
+    """Счётчики избранного и корзины меняются сигналами ровно на один"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MeUser.objects.create_user(
+            username='counter', email='counter@example.com', password='pass'
+        )
+        cls.recipe = MeRecipe.objects.create(
+            name_recipe='Каша', author=cls.user, discriptions='Описание',
+            illustration='recipes/kasha.png', data=timezone.now(), time=10
+        )
+
+    def counters(self):
+        self.recipe.refresh_from_db()
+        return self.recipe.favorites_count, self.recipe.in_carts_count
+
+    def test_api_and_orm(self):
+        self.client.force_login(self.user)
+        url = f'/recipe/recipes/{self.recipe.id}/'
+        self.assertEqual(self.client.post(f'{url}favorite/').status_code, 201)
+        self.assertEqual(self.client.post(f'{url}favorite/').status_code, 400)
+        ShoppingList.objects.create(
+            user=self.user, recipe=self.recipe, data=timezone.now()
+        )
+        self.assertEqual(self.counters(), (1, 1))
+        self.client.delete(f'{url}favorite/')
+        ShoppingList.objects.all().delete()
+        self.assertEqual(self.counters(), (0, 0))
+
+
+class CursorPaginationTest(TestCase):
+    """Курсор по всем полям сортировки проходит ленту без повторов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = MeUser.objects.create_user(
+            username='feed', email='feed@example.com', password='pass'
+        )
+        # Половина рецептов с одной датой и почти все с нулевым счётчиком:
+        # порядок решают вторые и третьи поля ключа
+        now = timezone.now()
+        MeRecipe.objects.bulk_create([
+            MeRecipe(
+                name_recipe=f'Рецепт {i}', author=author,
+                discriptions='Описание', illustration='', time=10,
+                data=now if i % 2 else now - timedelta(minutes=i),
+                favorites_count=1 if i < 3 else 0
+            ) for i in range(15)
+        ])
+
+    def walk(self, url, link):
+        """Страницы по ссылкам link до конца ленты"""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            pages.append([recipe['id'] for recipe in data['results']])
+            url = data[link]
+        return pages, data
+
+    def test_walk_both_orderings(self):
+        for params, ordering in (
+            ('', ('-data', '-id')),
+            ('&ordering=popular', ('-favorites_count', '-data', '-id')),
+        ):
+            expected = list(MeRecipe.objects.order_by(
+                *ordering).values_list('id', flat=True))
+            pages, last = self.walk(
+                f'/recipe/recipes/?pagination=cursor{params}', 'next'
+            )
+            self.assertEqual(sum(pages, []), expected)
+            back, _ = self.walk(last['previous'], 'previous')
+            self.assertEqual(back, pages[-2::-1])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            '/recipe/recipes/?pagination=cursor&cursor=cD0lNUIlNUQ%3D'
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class CategorySnapshotTest(TestCase):
+    """Теги из снимка в памяти и фильтр ленты по слагам"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = MeUser.objects.create_user(
+            username='tagger', email='tagger@example.com', password='pass'
+        )
+        cls.breakfast = MeCategory.objects.create(
+            name_category='Завтрак', slug='breakfast', color='#E26C2D'
+        )
+        cls.dinner = MeCategory.objects.create(
+            name_category='Ужин', slug='dinner', color='#49B64E'
+        )
+        cls.recipes = {}
+        for name, tags in (('Омлет', [cls.breakfast]),
+                           ('Рагу', [cls.dinner]),
+                           ('Салат', [])):
+            recipe = MeRecipe.objects.create(
+                name_recipe=name, author=author, discriptions='Описание',
+                illustration='', data=timezone.now(), time=10
+            )
+            recipe.tags.set(tags)
+            cls.recipes[name] = recipe.id
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self):
+        response = self.client.get('/recipe/tags/')
+        self.assertEqual(response.status_code, 200)
+        return [row['name_category'] for row in response.json()['results']]
+
+    def test_list_from_snapshot(self):
+        self.assertEqual(self.names(), ['Завтрак', 'Ужин'])
+        with self.assertNumQueries(0):
+            response = self.client.get('/recipe/tags/')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=', response['Cache-Control'])
+
+    def test_refresh_after_change(self):
+        etag = self.client.get('/recipe/tags/')['ETag']
+        self.breakfast.name_category = 'Утро'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.breakfast.save()
+            MeCategory.objects.create(name_category='Обед', slug='lunch')
+        response = self.client.get('/recipe/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.names(), ['Утро', 'Ужин', 'Обед'])
+        response = self.client.get(
+            '/recipe/recipes/', {'tags': 'lunch'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_tags_filter(self):
+        def ids(*slugs):
+            response = self.client.get('/recipe/recipes/', {'tags': slugs})
+            self.assertEqual(response.status_code, 200)
+            return {recipe['id'] for recipe in response.json()['results']}
+
+        self.assertEqual(ids('breakfast'), {self.recipes['Омлет']})
+        self.assertEqual(ids('breakfast', 'dinner'), {
+            self.recipes['Омлет'], self.recipes['Рагу']
+        })
+        response = self.client.get('/recipe/recipes/', {'tags': 'unknown'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTest(TestCase):
+    """Повторный запрос с If-None-Match получает 304"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MeUser.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        cls.recipe = MeRecipe.objects.create(
+            name_recipe='Каша', author=cls.user, discriptions='Описание',
+            illustration='', data=timezone.now(), time=10
+        )
+
+    def test_recipe_detail(self):
+        url = f'/recipe/recipes/{self.recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        self.recipe.save()
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+    def assertChangesEtag(self, url, change):
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+    def test_related_renames_change_etag(self):
+        ingredient = MeIngredient.objects.create(
+            name='Гречка', unit_of_measure='г'
+        )
+        IngredientsRecipe.objects.create(
+            name_recipe=self.recipe, name_ingredients=ingredient, quantity=1
+        )
+        ingredient.name = 'Крупа'
+        self.user.first_name = 'Анна'
+        for url in ('/recipe/recipes/', f'/recipe/recipes/{self.recipe.id}/'):
+            self.assertChangesEtag(url, ingredient.save)
+            self.assertChangesEtag(url, self.user.save)
+
+    def test_version_bumped_after_commit(self):
+        before = get_version(RECIPES_VERSION)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.recipe.save()
+            self.assertEqual(get_version(RECIPES_VERSION), before)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_version(RECIPES_VERSION), before)
+
+    def test_favorite_changes_etag(self):
+        self.client.force_login(self.user)
+        url = '/recipe/recipes/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Select.objects.create(
+                user=self.user, name_recipe=self.recipe, data=timezone.now()
+            )
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+
+@override_settings(ASYNC_HOT_PATHS=True)
+class AsyncHotPathTest(TestCase):
+    """Быстрый путь ASGI отдаёт те же ETag, что и вьюсет"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MeUser.objects.create_user(
+            username='async', email='async@example.com', password='pass'
+        )
+        cls.recipe = MeRecipe.objects.create(
+            name_recipe='Каша', author=cls.user, discriptions='Описание',
+            illustration='', data=timezone.now(), time=10
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def fast_get(self, view, url, etag=None, **kwargs):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return async_to_sync(view)(self.factory.get(url, **headers), **kwargs)
+
+    def test_same_etag_and_author_rename(self):
+        for view, url, kwargs in (
+            (async_views.recipe_list, '/recipe/recipes/', {}),
+            (async_views.recipe_detail, f'/recipe/recipes/{self.recipe.id}/',
+             {'pk': self.recipe.id}),
+        ):
+            etag = self.client.get(url)['ETag']
+            response = self.fast_get(view, url, **kwargs)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(
+                self.fast_get(view, url, etag, **kwargs).status_code, 304
+            )
+            self.user.first_name = f'Автор {view.__name__}'
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.save()
+            response = self.fast_get(view, url, etag, **kwargs)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['ETag'], self.client.get(url)['ETag'])
+
+
+class CacheStatsTest(TestCase):
+    """Статистика кэша ответов доступна персоналу"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = MeUser.objects.create_user(
+            username='admin', email='admin@example.com', password='pass',
+            is_staff=True
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hits_and_misses(self):
+        self.client.get('/recipe/recipes/')
+        self.client.get('/recipe/recipes/')
+        self.client.force_login(self.admin)
+        response = self.client.get('/recipe/recipes/cache_stats/')
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+
+class ResponseCacheTest(TestCase):
+    """Анонимные ответы берутся из кэша до смены версии"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MeUser.objects.create_user(
+            username='chef', email='chef@example.com', password='pass'
+        )
+        cls.recipe = MeRecipe.objects.create(
+            name_recipe='Борщ', author=cls.user, discriptions='Описание',
+            illustration='', data=timezone.now(), time=90
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hit_and_invalidation(self):
+        # Рецепту для Last-Modified нужен его updated_at
+        for url, queries in (('/recipe/recipes/', 0),
+                             (f'/recipe/recipes/{self.recipe.id}/', 1)):
+            cache.clear()
+            self.client.get(url)
+            with self.assertNumQueries(queries):
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(
+                (cache_stats()['hits'], cache_stats()['misses']), (1, 1)
+            )
+            self.recipe.name_recipe = f'Борщ {url}'
+            with self.captureOnCommitCallbacks(execute=True):
+                self.recipe.save()
+            response = self.client.get(url)
+            data = response.data
+            if 'results' in data:
+                data = data['results'][0]
+            self.assertEqual(data['name_recipe'], f'Борщ {url}')
+            self.assertEqual(cache_stats()['misses'], 2)
+
+    def test_authenticated_bypass(self):
+        self.client.force_login(self.user)
+        self.client.get('/recipe/recipes/')
+        self.client.get('/recipe/recipes/')
+        self.assertEqual(
+            (cache_stats()['hits'], cache_stats()['misses']), (0, 0)
+        )
+
+
+class FollowStateTest(TestCase):
+    """Подписки на авторов страницы узнаются одним запросом"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MeUser.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+
+    def add_recipes(self, count):
+        for _ in range(count):
+            number = MeUser.objects.count()
+            author = MeUser.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com', password='pass'
+            )
+            MeRecipe.objects.create(
+                name_recipe='Салат', author=author, discriptions='Описание',
+                illustration='', data=timezone.now(), time=5
+            )
+            if number % 2:
+                MeFollow.objects.create(user=self.user, author=author)
+
+    def page_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/recipe/recipes/')
+        results = response.json()['results']
+        for item in results:
+            self.assertEqual(
+                item['author']['is_followers'],
+                MeFollow.objects.filter(
+                    user=self.user, author_id=item['author']['id']
+                ).exists()
+            )
+        return len(results), len(queries)
+
+    def test_queries_do_not_depend_on_page_size(self):
+        self.client.force_login(self.user)
+        self.add_recipes(2)
+        small, small_queries = self.page_queries()
+        self.add_recipes(4)
+        large, large_queries = self.page_queries()
+        self.assertLess(small, large)
+        self.assertEqual(small_queries, large_queries)
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    """Чтение списка уходит на реплику, кроме как сразу после записи
+
+    Роль реплики играет default: проверяется выбор роутера. Внутри
+    транзакции роутер всегда читает основную базу, поэтому тест
+    без обёртки TestCase. Реплика включается только на время запроса:
+    очистка базы между тестами пропускает базы из DATABASE_REPLICAS.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = MeUser.objects.create_user(
+            username='cook', email='cook@example.com', password='pass'
+        )
+        self.recipe = MeRecipe.objects.create(
+            name_recipe='Плов', author=self.user, discriptions='Описание',
+            illustration='', data=timezone.now(), time=60
+        )
+        self.client.force_login(self.user)
+
+    def replica_reads(self, method, url):
+        with override_settings(DATABASE_REPLICAS=[DEFAULT_DB_ALIAS]), \
+                mock.patch.object(ReplicaRouter, 'choose_replica',
+                                  return_value=DEFAULT_DB_ALIAS) as choose:
+            response = getattr(self.client, method)(url)
+        return response, choose.call_count
+
+    def test_read_after_write(self):
+        url = '/recipe/recipes/'
+        response, reads = self.replica_reads('get', url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(reads, 0)
+
+        favorite = f'{url}{self.recipe.id}/favorite/'
+        response, reads = self.replica_reads('post', favorite)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(reads, 0)
+
+        _, reads = self.replica_reads('get', url)
+        self.assertEqual(reads, 0)
+        # Другой процесс без общего кэша: закрепление держит cookie
+        cache.clear()
+        _, reads = self.replica_reads('get', url)
+        self.assertEqual(reads, 0)
+        del self.client.cookies[STICKY_COOKIE]
+        _, reads = self.replica_reads('get', url)
+        self.assertGreater(reads, 0)
+
+    def test_validated_reads_from_primary(self):
+        url = f'/recipe/recipes/{self.recipe.id}/'
+        response, reads = self.replica_reads('get', url)
+        self.assertGreater(reads, 0)
+        # Ответ реплики мог отстать от версий, валидаторов у него нет
+        self.assertNotIn('ETag', response)
+
+        self.client.logout()
+        for path in (url, '/recipe/recipes/'):
+            response, reads = self.replica_reads('get', path)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(reads, 0)
+            self.assertIn('ETag', response)
+
+
+class RenditionTest(TestCase):
+    """Размер копии по месту в ответе и оригинал, пока копия собирается"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MeUser.objects.create_user(
+            username='photo', email='photo@example.com', password='pass'
+        )
+        cls.recipe = MeRecipe.objects.create(
+            name_recipe='Пирог', author=cls.user, discriptions='Описание',
+            illustration='recipes/pie.png', data=timezone.now(), time=40
+        )
+
+    def setUp(self):
+        cache.clear()
+        reset_renditions()
+        self.built = set()
+        storage = mock.patch.object(renditions, 'default_storage')
+        self.storage = storage.start()
+        self.addCleanup(storage.stop)
+        self.storage.exists.side_effect = self.built.__contains__
+        self.storage.url.side_effect = lambda name: f'/media/{name}'
+        self.list_url = '/recipe/recipes/'
+        self.detail_url = f'/recipe/recipes/{self.recipe.id}/'
+
+    def finish_builds(self):
+        name = self.recipe.illustration.name
+        for rendition in renditions.RENDITIONS:
+            for image_format in renditions.FORMATS:
+                self.built.add(
+                    renditions.rendition_name(name, rendition, image_format)
+                )
+        for _, future in renditions._executor.jobs:
+            future.set_result(name)
+
+    def test_pending_original(self):
+        for url in (self.list_url, self.detail_url) * 2:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.data
+            if url == self.list_url:
+                data = data['results'][0]
+            self.assertTrue(data['illustration'].endswith(
+                '/media/recipes/pie.png'
+            ))
+            self.assertNotIn('ETag', response)
+            self.assertIn('no-cache', response['Cache-Control'])
+        # Повторные ответы не ставят копии в очередь заново и не
+        # берутся из кэша ответов
+        self.assertEqual(
+            [args for args, _ in renditions._executor.jobs],
+            [('recipes/pie.png',)]
+        )
+        self.assertEqual(cache_stats()['hits'], 0)
+
+    def test_sizes(self):
+        self.client.get(self.list_url)
+        self.finish_builds()
+        response = self.client.get(self.list_url)
+        self.assertIn('ETag', response)
+        self.assertTrue(response.data['results'][0]['illustration'].endswith(
+            'renditions/recipes/pie_card.jpg'
+        ))
+        self.assertTrue(
+            self.client.get(self.detail_url).data['illustration'].endswith(
+                'renditions/recipes/pie_detail.jpg'
+            )
+        )
+        self.client.force_login(self.user)
+        response = self.client.post(f'{self.detail_url}favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.data['illustration'],
+            '/media/renditions/recipes/pie_thumb.jpg'
+        )
+
+
+class UploadLimitTest(TestCase):
+    """Лимит тела запроса и слоты пула разбора фото"""
+
+    @override_settings(RECIPE_UPLOAD_MAX_BYTES=100)
+    def test_limit_enforced_while_reading(self):
+        request = mock.Mock(META={'CONTENT_LENGTH': '10'})
+        body = b'{"name": "' + b'x' * 200 + b'"}'
+        with self.assertRaises(PayloadTooLarge):
+            LimitedJSONParser().parse(
+                BytesIO(body), 'application/json', {'request': request}
+            )
+
+    def test_spool_over_limit(self):
+        payload = base64.b64encode(b'x' * 100).decode()
+        with TemporaryDirectory() as directory, \
+                mock.patch('tempfile.tempdir', directory):
+            with self.assertRaises(images.ImageRejected):
+                images.spool_upload(payload, True, 10)
+            self.assertEqual(os.listdir(directory), [])
+
+    @override_settings(IMAGE_DECODE_TIMEOUT=0.1)
+    def test_slot_held_until_job_finishes(self):
+        release = Event()
+        paths = []
+
+        def decode(path, *args):
+            paths.append(path)
+            release.wait()
+            return b'', 'png'
+
+        slots = BoundedSemaphore(1)
+        executor = ThreadPoolExecutor(max_workers=1)
+        with mock.patch.object(images, 'get_executor',
+                               return_value=executor), \
+                mock.patch.object(images, '_slots', slots), \
+                mock.patch.object(images, 'decode_image', decode):
+            with self.assertRaises(images.ImageDecodeBusy):
+                images.process_image(base64.b64encode(b'img').decode(), True)
+        self.assertFalse(slots.acquire(blocking=False))
+        release.set()
+        executor.shutdown(wait=True)
+        self.assertTrue(slots.acquire(blocking=False))
+        self.assertFalse(os.path.exists(paths[0]))
+
+
+class FakeConnection:
+    """Соединение psycopg2 без сервера: считает проверки и откаты"""
+
+    def __init__(self):
+        self.closed = 0
+        self.healthy = True
+        self.checks = 0
+        self.info = mock.Mock(transaction_status=TRANSACTION_STATUS_IDLE)
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                return False
+
+            def execute(self, sql):
+                connection.checks += 1
+                if not connection.healthy:
+                    raise Error('server closed the connection')
+
+        return Cursor()
+
+    def rollback(self):
+        self.info.transaction_status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """Пул соединений на поддельном connect
+
+    Возраст соединений задаётся сдвигом self.now, ожидание свободного
+    соединения идёт по настоящим часам.
+    """
+
+    def setUp(self):
+        self.created = []
+
+    def freeze_clock(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(pool, 'monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self):
+        connection = FakeConnection()
+        self.created.append(connection)
+        return connection
+
+    def make_pool(self, **options):
+        options = {'max_size': 2, 'timeout': 0.05,
+                   'health_check_after': 30, 'max_lifetime': 1800, **options}
+        return pool.ConnectionPool(**options)
+
+    def test_checkout_reuses_idle(self):
+        connections = self.make_pool()
+        first = connections.checkout(self.connect)
+        first.info.transaction_status = TRANSACTION_STATUS_INTRANS
+        connections.checkin(first)
+        self.assertIs(connections.checkout(self.connect), first)
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(
+            first.info.transaction_status, TRANSACTION_STATUS_IDLE
+        )
+        stats = connections.snapshot()
+        self.assertEqual((stats['checkouts'], stats['in_use']), (2, 1))
+
+    def test_timeout_and_wakeup(self):
+        connections = self.make_pool(max_size=1)
+        held = connections.checkout(self.connect)
+        with self.assertRaises(OperationalError):
+            connections.checkout(self.connect)
+        self.assertEqual(connections.stats.timeouts, 1)
+
+        connections.timeout = 5
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            waiter = executor.submit(connections.checkout, self.connect)
+            while not connections.snapshot()['waiting']:
+                sleep(0.001)
+            connections.checkin(held)
+            self.assertIs(waiter.result(timeout=5), held)
+
+    def test_health_check_after_idle(self):
+        self.freeze_clock()
+        connections = self.make_pool()
+        connection = connections.checkout(self.connect)
+        connections.checkin(connection)
+        self.now += 10
+        self.assertIs(connections.checkout(self.connect), connection)
+        self.assertEqual(connection.checks, 0)
+
+        connections.checkin(connection)
+        self.now += 31
+        connection.healthy = False
+        replacement = connections.checkout(self.connect)
+        self.assertIsNot(replacement, connection)
+        self.assertEqual(connection.checks, 1)
+        self.assertTrue(connection.closed)
+        self.assertEqual(connections.stats.discarded, 1)
+        self.assertEqual(connections.snapshot()['size'], 1)
+
+    def test_recycle_old_connection(self):
+        self.freeze_clock()
+        connections = self.make_pool(max_lifetime=60)
+        connection = connections.checkout(self.connect)
+        self.now += 50
+        connections.checkin(connection)
+        self.now += 20
+        replacement = connections.checkout(self.connect)
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(connection.checks, 0)
+        self.assertEqual(connections.stats.created, 2)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
@@ -13,4 +14,15 @@ router.register(r'recipes', MeRecipeViewSet, basename='recipes')
 
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
+if settings.ASYNC_HOT_PATHS:
+    from . import async_views
+
+    # Перехватывают только точные адреса, остальное — маршрутизатор
+    urlpatterns = [
+        path('ingredients/', async_views.ingredient_list,
+             name='ingredients-list'),
+        path('recipes/', async_views.recipe_list, name='recipes-list'),
+        path('recipes/<int:pk>/', async_views.recipe_detail,
+             name='recipes-detail'),
+    ] + urlpatterns
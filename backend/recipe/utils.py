@@ -1,28 +1,41 @@
-from django.http import HttpResponse
+import csv
+from tempfile import SpooledTemporaryFile
+
+from django.db.models import F, Sum
 from reportlab.pdfgen import canvas
-from io import BytesIO
-from .models import IngredientsRecipe, ShoppingList
-from collections import defaultdict
+from .models import IngredientsRecipe
+
+PDF_SPOOL_SIZE = 1024 * 1024
 
 def generate_shopping_list(user):
-    """Генерация списка покупок"""
-    shopping_cart = ShoppingList.objects.filter(user=user).select_related('recipe')
-    ingredients = defaultdict(lambda: {'amount': 0, 'unit': ''})
-    
-    for item in shopping_cart:
-        for ri in item.recipe.recipe_ingredients.all():
-            key = ri.ingredient.name
-            ingredients[key]['amount'] += ri.amount
-            ingredients[key]['unit'] = ri.ingredient.measurement_unit
-    
-    return ingredients
+    """Генерация списка покупок
+
+    Один GROUP BY запрос по ингредиентам рецептов из корзины пользователя,
+    строки отдаются лениво в порядке названия ингредиента.
+    """
+    return (
+        IngredientsRecipe.objects
+        .filter(name_recipe__in_shopping_cart__user=user)
+        .values(
+            name=F('name_ingredients__name'),
+            unit=F('name_ingredients__unit_of_measure')
+        )
+        .annotate(amount=Sum('quantity'))
+        .order_by('name', 'unit')
+        .iterator()
+    )
 
 
 def generate_pdf_shopping_list(user):
-    """Генерация PDF со списком покупок"""
+    """Генерация PDF со списком покупок
+
+    reportlab собирает документ целиком только на save(), поэтому PDF
+    пишется во временный файл: в памяти держится не больше PDF_SPOOL_SIZE,
+    остальное уходит на диск и отдаётся клиенту частями.
+    """
     ingredients = generate_shopping_list(user)
     
-    buffer = BytesIO()
+    buffer = SpooledTemporaryFile(max_size=PDF_SPOOL_SIZE)
     p = canvas.Canvas(buffer)
     
     # Список покупок
@@ -32,8 +45,10 @@ def generate_pdf_shopping_list(user):
     
     # Список ингредиентов
     y = 750
-    for name, data in ingredients.items():
-        p.drawString(100, y, f"- {name} ({data['unit']}) — {data['amount']}")
+    for item in ingredients:
+        p.drawString(
+            100, y, f"- {item['name']} ({item['unit']}) — {item['amount']}"
+        )
         y -= 20
         if y < 50:
             p.showPage()
@@ -44,12 +59,27 @@ def generate_pdf_shopping_list(user):
     return buffer
 
 
-def generate_txt_shopping_list(user):
-    """Генерация TXT со списком покупок"""
-    ingredients = generate_shopping_list(user)
-    
-    content = "Список покупок:\n\n"
-    for name, data in ingredients.items():
-        content += f"- {name} ({data['unit']}) — {data['amount']}\n"
-    
-    return content
+def generate_txt_shopping_list(user, rows=None):
+    """Генерация TXT со списком покупок, построчно
+
+    rows — уже выбранные строки списка, без них строки читаются из базы
+    по ходу отдачи.
+    """
+    yield "Список покупок:\n\n"
+    for item in generate_shopping_list(user) if rows is None else rows:
+        yield f"- {item['name']} ({item['unit']}) — {item['amount']}\n"
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: записанная строка сразу возвращается"""
+
+    def write(self, value):
+        return value
+
+
+def generate_csv_shopping_list(user, rows=None):
+    """Генерация CSV со списком покупок, построчно, rows — как для TXT"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(['Ингредиент', 'Единица измерения', 'Количество'])
+    for item in generate_shopping_list(user) if rows is None else rows:
+        yield writer.writerow([item['name'], item['unit'], item['amount']])
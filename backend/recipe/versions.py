@@ -0,0 +1,83 @@
+from time import time_ns
+
+from django.core.cache import cache
+from django.db import transaction
+
+INGREDIENTS_VERSION = 'ingredients_version'
+RECIPES_VERSION = 'recipes_version'
+RECIPE_INGREDIENTS_VERSION = 'recipe_ingredients_version'
+CATEGORIES_VERSION = 'categories_version'
+AUTHORS_VERSION = 'authors_version'
+# Версии данных, которые рецепт показывает, но не хранит: теги,
+# названия ингредиентов и профиль автора
+RELATED_VERSIONS = (CATEGORIES_VERSION, INGREDIENTS_VERSION, AUTHORS_VERSION)
+
+# Журнал изменений хранит не больше стольких последних записей
+CHANGE_LOG_SIZE = 1000
+CHANGE_LOG_TIMEOUT = 60 * 60
+
+
+def initial_version():
+    """Начальная версия из текущего времени в микросекундах
+
+    Если ключ версии вытеснен из кэша, новая версия не повторит одну из
+    прежних и не совпадёт с ключами старых записей.
+    """
+    return time_ns() // 1000
+
+
+def get_version(key):
+    """Текущая версия набора данных, хранится в общем кэше"""
+    return cache.get_or_set(key, initial_version, timeout=None)
+
+
+def get_versions(keys):
+    """Версии нескольких наборов данных одним запросом к кэшу"""
+    found = cache.get_many(keys)
+    return tuple(
+        found[key] if key in found else get_version(key) for key in keys
+    )
+
+
+def bump_version(key):
+    """Сдвиг версии: все процессы перестраивают свои снимки"""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = initial_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def bump_version_on_commit(key):
+    """Сдвиг версии после фиксации транзакции
+
+    Сдвиг до фиксации позволил бы параллельному запросу закэшировать
+    ещё старые данные под новой версией.
+    """
+    transaction.on_commit(lambda: bump_version(key))
+
+
+def user_version_key(user_id):
+    """Версия избранного, корзины и подписок одного пользователя"""
+    return f'user_state_version:{user_id}'
+
+
+def log_change(key, item):
+    """Сдвиг версии с записью изменённого объекта в журнал"""
+    version = bump_version(key)
+    cache.set(f'{key}:{version}', item, timeout=CHANGE_LOG_TIMEOUT)
+
+
+def changes_since(key, since, version):
+    """Объекты, изменённые после версии since, или None
+
+    None означает, что журнал неполон и снимок нужно собрать заново.
+    """
+    if since is None or not 0 <= version - since <= CHANGE_LOG_SIZE:
+        return None
+    keys = [f'{key}:{number}' for number in range(since + 1, version + 1)]
+    found = cache.get_many(keys)
+    if len(found) != len(keys):
+        return None
+    return [found[name] for name in keys]
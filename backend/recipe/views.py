@@ -2,8 +2,19 @@ from rest_framework import viewsets, permissions, status
 from .models import MeIngredient, MeCategory, MeRecipe, Select, ShoppingList
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from functools import partial
+from foodgram.routers import ReplicaReadMixin
 from .models import (
     MeRecipe, MeCategory, MeIngredient, 
     Select, ShoppingList
@@ -21,15 +32,41 @@ from .serializers import (
 
 from django_filters.rest_framework import DjangoFilterBackend
 from .filters import RecipeFilter
+from .index import category_snapshot, ingredient_index, recipe_index
+from .pagination import RecipeCursorPagination
+from .renditions import track_pending
+from .parsers import (
+    LimitedFormParser, LimitedJSONParser, LimitedMultiPartParser)
+from .cache import cache_stats, cached_data, response_cache_key, store_data
+from .conditional import ConditionalGetMixin
+from .versions import (
+    CATEGORIES_VERSION, INGREDIENTS_VERSION, RECIPES_VERSION,
+    RELATED_VERSIONS, get_version, get_versions)
 
-from .utils import generate_pdf_shopping_list, generate_txt_shopping_list
+from .utils import (
+    generate_csv_shopping_list,
+    generate_pdf_shopping_list,
+    generate_shopping_list,
+    generate_txt_shopping_list
+)
+
+
+class FileFormatNegotiation(DefaultContentNegotiation):
+    """?format= выбирает формат файла, а не рендерер DRF"""
+
+    def filter_renderers(self, renderers, format):
+        return renderers
 
-class MeIngredientViewSet(viewsets.ModelViewSet):
+
+class MeIngredientViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                          viewsets.ModelViewSet):
     """Представление для ингредиентов"""
     queryset = MeIngredient.objects.all()
     serializer_class = MeIngredientSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = None
+    # Список отдаётся из индекса, он строится по основной базе
+    replica_actions = ('retrieve',)
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -38,16 +75,98 @@ class MeIngredientViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(name__istartswith=name)
         return queryset
 
-class MeCategoryViewSet(viewsets.ModelViewSet):
-    """Представление для категорий"""
+    def get_validators(self, request, *args, **kwargs):
+        return self.request_etag(
+            request, get_version(INGREDIENTS_VERSION)
+        ), None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(self.search, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def search(self, request, *args, **kwargs):
+        """Автодополнение из индекса в памяти, без запроса к базе"""
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            if not limit.isdigit():
+                raise ValidationError(
+                    {'limit': ['Ожидается целое неотрицательное число']}
+                )
+            limit = int(limit)
+        return Response(ingredient_index.search(
+            request.query_params.get('name', ''), limit
+        ))
+
+
+class MeCategoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    """Представление для категорий
+
+    Чтение — из снимка в памяти процесса, с долгим Cache-Control:
+    после истечения клиент перепроверяет ответ по ETag версии.
+    """
     queryset = MeCategory.objects.all()
     serializer_class = MeCategorySerializer
 
-class MeRecipeViewSet(viewsets.ModelViewSet):
+    def get_validators(self, request, *args, **kwargs):
+        return self.request_etag(
+            request, get_version(CATEGORIES_VERSION)
+        ), None
+
+    def list(self, request, *args, **kwargs):
+        return self.long_lived(
+            self.conditional(self.snapshot_list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.long_lived(
+            self.conditional(self.snapshot_detail, request, *args, **kwargs)
+        )
+
+    def snapshot_list(self, request, *args, **kwargs):
+        rows = category_snapshot.rows()
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(rows)
+        return self.get_paginated_response(page)
+
+    def snapshot_detail(self, request, pk=None):
+        row = category_snapshot.get(int(pk)) if str(pk).isdigit() else None
+        if row is None:
+            raise Http404
+        return Response(row)
+
+    @staticmethod
+    def long_lived(response):
+        if response.status_code in (
+                status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            patch_cache_control(
+                response, public=True, max_age=settings.CATEGORIES_MAX_AGE
+            )
+        return response
+
+
+class MeRecipeViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                      viewsets.ModelViewSet):
     """Представление для рецептов"""
-    queryset = MeRecipe.objects.all()
+    queryset = MeRecipe.objects.order_by('-data', '-id')
+    replica_actions = ('list', 'retrieve', 'cook')
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    parser_classes = [
+        LimitedJSONParser, LimitedFormParser, LimitedMultiPartParser
+    ]
+
+    @property
+    def pagination_class(self):
+        """?pagination=cursor включает курсорную пагинацию ленты"""
+        if (self.action == 'list'
+                and self.request.query_params.get('pagination') == 'cursor'):
+            return RecipeCursorPagination
+        return api_settings.DEFAULT_PAGINATION_CLASS
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -55,109 +174,249 @@ class MeRecipeViewSet(viewsets.ModelViewSet):
         return RecipeReadSerializer
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'cook']:
             return [permissions.AllowAny()]
+        if self.action == 'cache_stats':
+            return [permissions.IsAdminUser()]
         return [permissions.IsAuthenticated()]
 
+    def use_replica(self, request):
+        """Анонимные ответы кэшируются под версиями основной базы
+
+        Промах кэша читает её же: данные с реплики могли бы быть
+        старше версий в ключе и ETag.
+        """
+        return (
+            request.user.is_authenticated and super().use_replica(request)
+        )
+
+    def cached_response(self, view, request, *args, **kwargs):
+        """Готовый ответ для анонимных пользователей берётся из кэша"""
+        if request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        key = response_cache_key(request, self.action, kwargs.get('pk'))
+        data = cached_data(key)
+        if data is not None:
+            return Response(data)
+        with track_pending() as renditions:
+            response = view(request, *args, **kwargs)
+        # Ответ с адресами ещё не собранных копий не кэшируется
+        if (response.status_code == status.HTTP_200_OK
+                and not renditions.pending):
+            store_data(key, response.data)
+        return response
+
+    @staticmethod
+    def etag_parts(updated_at=None):
+        """Части ETag: списка — версия рецептов, рецепта — его updated_at
+
+        В оба входят версии тегов, ингредиентов и авторов: их
+        переименование меняет ответ, но не рецепт. Те же части берёт
+        быстрый путь async_views.
+        """
+        if updated_at is None:
+            return get_versions((RECIPES_VERSION,) + RELATED_VERSIONS)
+        return (updated_at.isoformat(),) + get_versions(RELATED_VERSIONS)
+
+    def get_validators(self, request, pk=None):
+        """ETag по etag_parts, Last-Modified — только рецепту для анонима
+
+        Для остальных ответ зависит ещё и от избранного и корзины, это
+        учитывает лишь ETag.
+        """
+        if pk is None:
+            return self.request_etag(
+                request, *self.etag_parts(), per_user=True
+            ), None
+        if not str(pk).isdigit():
+            return None, None
+        updated_at = MeRecipe.objects.using(DEFAULT_DB_ALIAS).filter(
+            pk=pk
+        ).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None, None
+        etag = self.request_etag(
+            request, *self.etag_parts(updated_at), per_user=True
+        )
+        if request.user.is_authenticated:
+            return etag, None
+        return etag, updated_at
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(
+            partial(self.cached_response, super().list),
+            request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(
+            partial(self.cached_response, super().retrieve),
+            request, *args, **kwargs
+        )
+
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """Попадания и промахи кэша ответов"""
+        return Response(cache_stats())
+
+    @action(detail=False, methods=['get'])
+    def cook(self, request):
+        """Что можно приготовить: ?ingredients=1,2,3&missing=1
+
+        Рецепты упорядочены по доле своих ингредиентов, которые есть
+        у пользователя, missing ограничивает число недостающих.
+        """
+        return self.cached_response(self.cook_list, request)
+
+    def cook_list(self, request):
+        params = request.query_params
+        ingredients = [
+            value.strip()
+            for item in params.getlist('ingredients')
+            for value in item.split(',') if value.strip()
+        ]
+        if not ingredients or not all(
+            value.isdigit() for value in ingredients
+        ):
+            raise ValidationError(
+                {'ingredients': ['Ожидается список id ингредиентов']}
+            )
+        missing = params.get('missing')
+        if missing is not None:
+            if not missing.isdigit():
+                raise ValidationError(
+                    {'missing': ['Ожидается целое неотрицательное число']}
+                )
+            missing = int(missing)
+
+        matches = recipe_index.search(map(int, ingredients), missing)
+        page = self.paginator.paginate_queryset(matches, request, view=self)
+        rows = matches if page is None else page
+        recipes = self.get_queryset().in_bulk([row[0] for row in rows])
+        rows = [row for row in rows if row[0] in recipes]
+        data = RecipeReadSerializer(
+            [recipes[row[0]] for row in rows], many=True,
+            context=self.get_serializer_context()
+        ).data
+        for item, (_, found, total) in zip(data, rows):
+            item['ingredients_found'] = found
+            item['ingredients_missing'] = total - found
+        if page is None:
+            return Response(data)
+        return self.paginator.get_paginated_response(data)
+
     def get_queryset(self):
         queryset = super().get_queryset().select_related('author')
-        queryset = queryset.prefetch_related('tags', 'recipe_ingredients__ingredient')
+        queryset = queryset.prefetch_related(
+            'tags', 'recipe_ingredients__name_ingredients'
+        )
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+
+        # Флаги избранного и корзины считаются подзапросами,
+        # а не отдельным запросом на каждый рецепт
+        queryset = queryset.annotate(
+            is_favorited=Exists(
+                Select.objects.filter(user=user, name_recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingList.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+        )
         
         # Фильтрация по избранному
-        is_favorited = self.request.query_params.get('is_favorited')
-        if is_favorited and self.request.user.is_authenticated:
-            queryset = queryset.filter(in_favorites__user=self.request.user)
+        if self.request.query_params.get('is_favorited'):
+            queryset = queryset.filter(is_favorited=True)
         
         # Фильтрация по списку покупок
-        is_in_shopping_cart = self.request.query_params.get('is_in_shopping_cart')
-        if is_in_shopping_cart and self.request.user.is_authenticated:
-            queryset = queryset.filter(in_shopping_cart__user=self.request.user)
+        if self.request.query_params.get('is_in_shopping_cart'):
+            queryset = queryset.filter(is_in_shopping_cart=True)
         
         return queryset
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def add_to_list(self, request, pk, model, recipe_field,
+                    serializer_class):
+        """Добавление, счётчик увеличивает сигнал post_save"""
+        recipe = get_object_or_404(MeRecipe, id=pk)
+        item, created = model.objects.get_or_create(
+            user=request.user, **{recipe_field: recipe},
+            defaults={'data': timezone.now()}
+        )
+        if not created:
+            raise ValidationError({'errors': ['Рецепт уже добавлен']})
+        return Response(
+            serializer_class(item, context={'request': request}).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    def remove_from_list(self, request, pk, model, recipe_field):
+        """Удаление, счётчик уменьшает сигнал post_delete"""
+        recipe = get_object_or_404(MeRecipe, id=pk)
+        item = get_object_or_404(
+            model, user=request.user, **{recipe_field: recipe}
+        )
+        item.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(detail=True, methods=['post', 'delete'])
     def favorite(self, request, pk=None):
         """Добавление/удаление рецепта в избранное"""
-        recipe = get_object_or_404(MeRecipe, id=pk)
-        
         if request.method == 'POST':
-            data = {'user': request.user.id, 'recipe': recipe.id}
-            serializer = FavoriteSerializer(
-                data=data,
-                context={'request': request}
-            )
-            if serializer.is_valid():
-                serializer.save()
-                return Response(
-                    serializer.data, 
-                    status=status.HTTP_201_CREATED
-                )
-            return Response(
-                serializer.errors, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        elif request.method == 'DELETE':
-            favorite = get_object_or_404(
-                Select,
-                user=request.user,
-                recipe=recipe
+            return self.add_to_list(
+                request, pk, Select, 'name_recipe', FavoriteSerializer
             )
-            favorite.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.remove_from_list(request, pk, Select, 'name_recipe')
 
     @action(detail=True, methods=['post', 'delete'])
     def shopping_cart(self, request, pk=None):
         """Добавление/удаление рецепта в список покупок"""
-        recipe = get_object_or_404(MeRecipe, id=pk)
-        
         if request.method == 'POST':
-            data = {'user': request.user.id, 'recipe': recipe.id}
-            serializer = ShoppingListSerializer(
-                data=data, 
-                context={'request': request}
+            return self.add_to_list(
+                request, pk, ShoppingList, 'recipe', ShoppingListSerializer
             )
-            if serializer.is_valid():
-                serializer.save()
-                return Response(
-                    serializer.data, 
-                    status=status.HTTP_201_CREATED
-                )
-            return Response(
-                serializer.errors, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        elif request.method == 'DELETE':
-            cart_item = get_object_or_404(
-                ShoppingList,
-                user=request.user,
-                recipe=recipe
-            )
-            cart_item.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.remove_from_list(request, pk, ShoppingList, 'recipe')
 
-    @action(detail=False, methods=['get'])
+    @action(
+        detail=False,
+        methods=['get'],
+        content_negotiation_class=FileFormatNegotiation
+    )
     def download_shopping_cart(self, request):
         """Скачивание списка покупок"""
         format = request.query_params.get('format', 'txt')
         
         if format == 'pdf':
-            buffer = generate_pdf_shopping_list(request.user)
-            response = HttpResponse(
-                buffer, 
+            return FileResponse(
+                generate_pdf_shopping_list(request.user),
+                as_attachment=True,
+                filename='shopping_list.pdf',
                 content_type='application/pdf'
             )
-            response['Content-Disposition'] = 'attachment; filename="shopping_list.pdf"'
+        # Под ASGI Django 3.2 перебирает тело ответа в цикле событий, где
+        # запросы к базе запрещены: строки выбираются здесь, в потоке
+        # представления. Под WSGI они читаются из базы по ходу отдачи.
+        rows = None
+        if isinstance(request._request, ASGIRequest):
+            rows = list(generate_shopping_list(request.user))
+        if format == 'csv':
+            response = StreamingHttpResponse(
+                generate_csv_shopping_list(request.user, rows),
+                content_type='text/csv; charset=utf-8'
+            )
+            response['Content-Disposition'] = (
+                'attachment; filename="shopping_list.csv"'
+            )
         else:
-            content = generate_txt_shopping_list(request.user)
-            response = HttpResponse(
-                content, 
-                content_type='text/plain'
+            response = StreamingHttpResponse(
+                generate_txt_shopping_list(request.user, rows),
+                content_type='text/plain; charset=utf-8'
+            )
+            response['Content-Disposition'] = (
+                'attachment; filename="shopping_list.txt"'
             )
-            response['Content-Disposition'] = 'attachment; filename="shopping_list.txt"'
         
         return response